@@ -1,5 +1,7 @@
+from .analytics import router as analytics_router
 from .auth import router as auth_router
 from .listings import router as listings_router
+from .media import router as media_router
 from .webhooks import router as webhooks_router
 
-__all__ = ["auth", "listings", "webhooks"]
+__all__ = ["analytics", "auth", "listings", "media", "webhooks"]
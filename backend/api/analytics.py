@@ -0,0 +1,76 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import DateTime, func
+from sqlalchemy.orm import Session
+
+from models import User, ListingStatus, ListingStatusHistory
+from .dependencies import get_current_user, get_user_db
+from .analytics_schemas import StageDuration, StageDurationsResponse
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Statuses in which a listing waits on n8n or eBay rather than on its owner
+# (or, once published, on nothing at all)
+PIPELINE_STATUSES = {ListingStatus.GENERATING_MEDIA, ListingStatus.PUBLISHING}
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of pre-sorted values."""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+@router.get("/stage-durations", response_model=StageDurationsResponse)
+def get_stage_durations(
+    window_hours: int = Query(24, ge=1, le=24 * 90),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Get per-stage duration percentiles for listings entering a stage in the window."""
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    
+    # Each stage lasts from entering a status until the next transition
+    next_entered_at = func.lead(ListingStatusHistory.created_at, type_=DateTime).over(
+        partition_by=ListingStatusHistory.listing_id,
+        order_by=(ListingStatusHistory.created_at, ListingStatusHistory.id)
+    )
+    stages = (
+        db.query(
+            ListingStatusHistory.status,
+            ListingStatusHistory.created_at,
+            next_entered_at.label("next_entered_at")
+        )
+        .filter(ListingStatusHistory.user_id == current_user.id)
+        .subquery()
+    )
+    rows = db.query(stages).filter(stages.c.created_at >= since).all()
+    
+    durations: dict[ListingStatus, list[float]] = defaultdict(list)
+    in_progress: dict[ListingStatus, int] = defaultdict(int)
+    idle: dict[ListingStatus, int] = defaultdict(int)
+    for stage_status, entered_at, left_at in rows:
+        if left_at is None and stage_status in PIPELINE_STATUSES:
+            in_progress[stage_status] += 1
+        elif left_at is None:
+            idle[stage_status] += 1
+        else:
+            durations[stage_status].append((left_at - entered_at).total_seconds())
+    
+    result = {}
+    for stage_status in ListingStatus:
+        values = sorted(durations[stage_status])
+        if not values and not in_progress[stage_status] and not idle[stage_status]:
+            continue
+        result[stage_status.value] = StageDuration(
+            count=len(values),
+            in_progress=in_progress[stage_status],
+            idle=idle[stage_status],
+            p50=_percentile(values, 50) if values else None,
+            p90=_percentile(values, 90) if values else None,
+            p99=_percentile(values, 99) if values else None,
+            max=values[-1] if values else None
+        )
+    
+    return StageDurationsResponse(window_hours=window_hours, stages=result)
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+
+
+class StageDuration(BaseModel):
+    """Duration statistics (in seconds) for one pipeline stage."""
+    count: int
+    # Listings still waiting on n8n or eBay in this stage
+    in_progress: int
+    # Listings still in this status with nothing pending (terminal, or left
+    # to the user), which have no duration yet
+    idle: int = 0
+    p50: float | None = None
+    p90: float | None = None
+    p99: float | None = None
+    max: float | None = None
+
+
+class StageDurationsResponse(BaseModel):
+    """Schema for pipeline stage duration analytics."""
+    window_hours: int
+    stages: dict[str, StageDuration]
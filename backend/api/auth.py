@@ -1,13 +1,18 @@
+import logging
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.database import get_db, shard_for_new_user, shard_sessions
 from core.security import create_access_token, get_password_hash, verify_password
 from core.config import settings
 from models import User
+from services.events import notify_user_changed
+from services.sharding import sync_user_to_shard
 from .schemas import UserCreate, UserLogin, Token, UserResponse
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
@@ -30,7 +35,28 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
+    db.flush()
+    
+    # Place the user on a shard; the users directory is committed first so a
+    # failure cannot leave a copy of the user on the shard alone
+    new_user.shard_id = shard_for_new_user(new_user.id)
+    notify_user_changed(db, new_user.id)
     db.commit()
+    
+    if new_user.shard_id != 0:
+        shard_db = shard_sessions[new_user.shard_id]()
+        try:
+            sync_user_to_shard(shard_db, new_user)
+            shard_db.commit()
+        except Exception:
+            logger.exception("Could not copy user %s to shard %s; keeping them on shard 0", new_user.id, new_user.shard_id)
+            # The primary always holds the user row, so shard 0 is a valid home
+            new_user.shard_id = 0
+            notify_user_changed(db, new_user.id)
+            db.commit()
+        finally:
+            shard_db.close()
+    
     db.refresh(new_user)
     
     return new_user
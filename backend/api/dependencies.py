@@ -1,19 +1,65 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.config import settings
+from core.database import get_db, shard_sessions
 from core.security import decode_access_token
 from models import User
+from services.events import GenerationTracker, change_bus
 
 security = HTTPBearer()
 
 
+class UserCache:
+    """
+    Small thread-safe LRU cache of detached users, each stored with the
+    generation it was loaded at.
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.generations = GenerationTracker("user")
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[tuple, User]] = OrderedDict()
+    
+    def get(self, user_id: int, generation: tuple) -> Optional[User]:
+        """Return the cached user if it was loaded at the given generation."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != generation:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+    
+    def set(self, user_id: int, generation: tuple, user: User) -> None:
+        """Store a detached user, evicting the least recently used entry."""
+        with self._lock:
+            self._entries[user_id] = (generation, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+user_cache = UserCache(settings.user_cache_size)
+change_bus.subscribe(user_cache.generations)
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
-    """Get current authenticated user."""
+    """
+    Get current authenticated user.
+    
+    With change notifications enabled, users are cached per worker until a
+    change to them is announced. Cached users are detached from any session
+    and shared between requests, so they must not be modified.
+    """
     token = credentials.credentials
     payload = decode_access_token(token)
     
@@ -30,11 +76,51 @@ def get_current_user(
             detail="Invalid token payload"
         )
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user_id = int(user_id)
+    if settings.events_enabled:
+        generation = user_cache.generations.get(user_id)
+        user = user_cache.get(user_id, generation)
+        if user is not None:
+            return user
+    
+    user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
+    if settings.events_enabled:
+        db.expunge(user)
+        user_cache.set(user_id, generation, user)
+    
     return user
+
+
+def get_user_db(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Database session for the shard holding the current user's listings."""
+    if current_user.moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="User's listings are being moved; retry shortly",
+            headers={"Retry-After": str(int(settings.rebalance_drain_seconds))}
+        )
+    
+    if current_user.shard_id == 0:
+        yield db
+        return
+    
+    if current_user.shard_id >= len(shard_sessions):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="User's database shard is not configured"
+        )
+    
+    shard_db = shard_sessions[current_user.shard_id]()
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
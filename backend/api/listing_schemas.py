@@ -1,7 +1,9 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional
 
+from models import ListingStatus
+
 
 class ListingCreate(BaseModel):
     """Schema for creating a listing."""
@@ -29,7 +31,80 @@ class ListingUpdate(BaseModel):
     target_audience: Optional[str] = None
     product_features: Optional[str] = None
     video_setting: Optional[str] = None
-    status: Optional[str] = None
+    status: Optional[ListingStatus] = None
+
+
+class PublishRequest(BaseModel):
+    """Schema for publishing a listing (defaults to all marketplaces)."""
+    marketplaces: Optional[list[str]] = None
+    
+    @field_validator("marketplaces")
+    @classmethod
+    def reject_duplicates(cls, marketplaces: Optional[list[str]]) -> Optional[list[str]]:
+        if marketplaces is not None and len(set(marketplaces)) != len(marketplaces):
+            raise ValueError("Marketplaces must not repeat")
+        return marketplaces
+
+
+class ListingFilter(BaseModel):
+    """Schema for selecting listings in bulk by ID and/or filters."""
+    listing_ids: Optional[list[int]] = None
+    status: Optional[ListingStatus] = None
+    category_id: Optional[str] = None
+    created_before: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+
+
+class BulkDeleteRequest(ListingFilter):
+    """Schema for deleting listings in bulk (optionally as a background job)."""
+    background: bool = False
+
+
+class BulkUpdateItem(ListingUpdate):
+    """Schema for the new values of one listing in a bulk update."""
+    id: int
+
+
+class BulkUpdateRule(BaseModel):
+    """Schema for a bulk update applied to every selected listing."""
+    price_change_percent: Optional[float] = None
+    price_change_amount: Optional[float] = None
+    quantity_change: Optional[int] = None
+    values: Optional[ListingUpdate] = None
+
+
+class BulkUpdateRequest(ListingFilter):
+    """Schema for updating listings in bulk, with per-listing values or a rule."""
+    items: Optional[list[BulkUpdateItem]] = None
+    rule: Optional[BulkUpdateRule] = None
+    revise_published: bool = False
+    background: bool = False
+
+
+class BulkUpdateResponse(BaseModel):
+    """Schema for bulk update response."""
+    updated: int
+    revised: int
+
+
+class BulkDeleteResponse(BaseModel):
+    """Schema for bulk delete response."""
+    deleted: int
+
+
+class BulkJobResponse(BaseModel):
+    """Schema for bulk job progress response."""
+    id: str
+    kind: str
+    status: str
+    total: int
+    processed: int
+    error_message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
 
 
 class MediaResponse(BaseModel):
@@ -56,6 +131,19 @@ class PublishedListingResponse(BaseModel):
         from_attributes = True
 
 
+class PublicationResponse(BaseModel):
+    """Schema for per-marketplace publication response."""
+    marketplace: str
+    status: str
+    external_item_id: Optional[str] = None
+    external_url: Optional[str] = None
+    error_message: Optional[str] = None
+    published_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
 class ListingResponse(BaseModel):
     """Schema for listing response."""
     id: int
@@ -73,10 +161,12 @@ class ListingResponse(BaseModel):
     enriched_description: Optional[str] = None
     status: str
     error_message: Optional[str] = None
+    version: int
     created_at: datetime
     updated_at: datetime
     media: Optional[MediaResponse] = None
     published_listing: Optional[PublishedListingResponse] = None
+    publications: list[PublicationResponse] = []
     
     class Config:
         from_attributes = True
@@ -1,22 +1,64 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import uuid
+from functools import partial
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
-from core.database import get_db
-from models import User, Listing, ListingStatus
-from .dependencies import get_current_user
-from .listing_schemas import ListingCreate, ListingUpdate, ListingResponse
+from core.compression import PayloadCache, compress_payload, negotiate_encoding
+from core.config import settings
+from core.database import shard_sessions
+from core.metrics import metrics
+from models import User, Listing, Media, ListingStatus, BulkJob, BulkJobStatus
+from .dependencies import get_current_user, get_user_db
+from .listing_schemas import (
+    ListingCreate,
+    ListingUpdate,
+    ListingResponse,
+    ListingFilter,
+    PublishRequest,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    BulkUpdateRequest,
+    BulkUpdateResponse,
+    BulkJobResponse,
+)
+from .media import media_storage, media_url, thumbnail_cache
+from .transitions import transition_listing
+from services.archive import RestoreConflictError, get_archived_listing, restore_listing
+from services.bulk import count_listings, create_job, delete_listings, reap_stale_jobs, run_job, update_listings
+from services.events import GenerationTracker, change_bus, notify_listing_changed
+from services.publications import collect_revisions, start_publications, trigger_publication, trigger_revisions
+from services.media_storage import MediaUploadError
+from services.thumbnails import ThumbnailError
+from services.transitions import apply_transition, record_status
 from services.n8n_client import N8nClient
 
 router = APIRouter(prefix="/listings", tags=["listings"])
 n8n_client = N8nClient()
+listings_payload_cache = PayloadCache(settings.listings_payload_cache_mb * 1024 * 1024)
+listing_generations = GenerationTracker("listing")
+change_bus.subscribe(listing_generations)
+listing_list_adapter = TypeAdapter(List[ListingResponse])
+_background_tasks: set[asyncio.Task] = set()
+
+# Statuses from which media generation may be (re)started
+MEDIA_GENERATION_SOURCES = [
+    ListingStatus.DRAFT,
+    ListingStatus.MEDIA_READY,
+    ListingStatus.APPROVED,
+    ListingStatus.ERROR,
+]
 
 
 @router.post("", response_model=ListingResponse, status_code=status.HTTP_201_CREATED)
 def create_listing(
     listing_data: ListingCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Create a new listing."""
     new_listing = Listing(
@@ -35,6 +77,9 @@ def create_listing(
     )
     
     db.add(new_listing)
+    db.flush()
+    record_status(db, new_listing)
+    notify_listing_changed(db, current_user.id, new_listing.id)
     db.commit()
     db.refresh(new_listing)
     
@@ -43,26 +88,64 @@ def create_listing(
 
 @router.get("", response_model=List[ListingResponse])
 def get_listings(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Get all listings for the current user."""
-    listings = db.query(Listing).filter(Listing.user_id == current_user.id).all()
-    return listings
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    
+    if settings.events_enabled:
+        # Every listing change is announced on the change bus, so no query is
+        # needed to tell whether the cached body is still current
+        cache_key = (current_user.id, listing_generations.get(current_user.id), encoding)
+    else:
+        # Any insert, update or delete changes the count or the latest updated_at;
+        # a move to another shard keeps both but renumbers the listings
+        count, last_updated = db.query(
+            func.count(Listing.id),
+            func.max(Listing.updated_at)
+        ).filter(Listing.user_id == current_user.id).one()
+        cache_key = (current_user.id, current_user.shard_id, count, last_updated, encoding)
+    
+    cached = listings_payload_cache.get(cache_key)
+    
+    if cached is not None:
+        metrics.increment("listings.payload_cache.hits")
+        body, body_encoding = cached
+    else:
+        metrics.increment("listings.payload_cache.misses")
+        listings = db.query(Listing).filter(Listing.user_id == current_user.id).all()
+        body = listing_list_adapter.dump_json(
+            listing_list_adapter.validate_python(listings, from_attributes=True)
+        )
+        body_encoding = encoding if len(body) >= settings.compression_min_size else "identity"
+        body = compress_payload(body, body_encoding)
+        listings_payload_cache.set(cache_key, body, body_encoding)
+    
+    headers = {"Vary": "Accept-Encoding"}
+    if body_encoding != "identity":
+        headers["Content-Encoding"] = body_encoding
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{listing_id}", response_model=ListingResponse)
 def get_listing(
     listing_id: int,
+    include_archived: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Get a specific listing."""
+    """Get a specific listing, optionally falling back to the archive."""
     listing = db.query(Listing).filter(
         Listing.id == listing_id,
         Listing.user_id == current_user.id
     ).first()
     
+    if not listing and include_archived:
+        listing = get_archived_listing(db, listing_id, current_user.id)
+    
     if not listing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -77,9 +160,15 @@ def update_listing(
     listing_id: int,
     listing_data: ListingUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Update a listing."""
+    """
+    Update a listing.
+    
+    Status changes are applied as a compare-and-set transition from the
+    status and version that were read, so they cannot overwrite a concurrent
+    transition (409 instead).
+    """
     listing = db.query(Listing).filter(
         Listing.id == listing_id,
         Listing.user_id == current_user.id
@@ -91,11 +180,28 @@ def update_listing(
             detail="Listing not found"
         )
     
-    # Update fields
     update_data = listing_data.model_dump(exclude_unset=True)
+    new_status = update_data.pop("status", None)
+    if new_status is not None:
+        listing = transition_listing(
+            db,
+            listing.id,
+            listing.status,
+            new_status,
+            user_id=current_user.id,
+            criteria=[Listing.version == listing.version],
+            **update_data
+        )
+        db.commit()
+        db.refresh(listing)
+        return listing
+    
+    # Update fields
     for field, value in update_data.items():
         setattr(listing, field, value)
+    listing.version = Listing.version + 1
     
+    notify_listing_changed(db, current_user.id, listing.id)
     db.commit()
     db.refresh(listing)
     
@@ -106,7 +212,7 @@ def update_listing(
 def delete_listing(
     listing_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
     """Delete a listing."""
     listing = db.query(Listing).filter(
@@ -121,68 +227,283 @@ def delete_listing(
         )
     
     db.delete(listing)
+    notify_listing_changed(db, current_user.id, listing_id)
     db.commit()
     return None
 
 
-@router.post("/{listing_id}/generate-media", response_model=ListingResponse)
-async def generate_media(
-    listing_id: int,
+def _filter_criteria(listing_filter: ListingFilter) -> list:
+    """
+    Build WHERE clauses for a bulk listing selection.
+    
+    Raises:
+        HTTPException: If neither IDs nor filters are given
+    """
+    criteria = []
+    if listing_filter.status is not None:
+        criteria.append(Listing.status == listing_filter.status)
+    if listing_filter.category_id is not None:
+        criteria.append(Listing.category_id == listing_filter.category_id)
+    if listing_filter.created_before is not None:
+        criteria.append(Listing.created_at < listing_filter.created_before)
+    if listing_filter.updated_before is not None:
+        criteria.append(Listing.updated_at < listing_filter.updated_before)
+    
+    if listing_filter.listing_ids is None and not criteria:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide listing_ids or at least one filter"
+        )
+    
+    return criteria
+
+
+@router.post("/bulk-delete", response_model=Union[BulkDeleteResponse, BulkJobResponse])
+async def bulk_delete_listings(
+    delete_data: BulkDeleteRequest,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Trigger media generation via n8n workflow."""
-    listing = db.query(Listing).filter(
-        Listing.id == listing_id,
-        Listing.user_id == current_user.id
-    ).first()
+    """Delete listings by ID or filter, optionally as a background job."""
+    criteria = _filter_criteria(delete_data)
+    delete_matching = partial(
+        delete_listings,
+        user_id=current_user.id,
+        criteria=criteria,
+        listing_ids=delete_data.listing_ids,
+        chunk_size=settings.bulk_chunk_size
+    )
     
-    if not listing:
+    if not delete_data.background:
+        deleted = await run_in_threadpool(delete_matching, db)
+        return BulkDeleteResponse(deleted=deleted)
+    
+    total = await run_in_threadpool(
+        count_listings,
+        db,
+        current_user.id,
+        criteria,
+        delete_data.listing_ids
+    )
+    job = await run_in_threadpool(create_job, db, current_user.id, "delete", total)
+    
+    task = asyncio.create_task(run_in_threadpool(
+        run_job,
+        shard_sessions[current_user.shard_id],
+        job.id,
+        delete_matching
+    ))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
+    response.status_code = status.HTTP_202_ACCEPTED
+    return job
+
+
+def _bulk_update_values(update_data: BulkUpdateRequest) -> tuple[Optional[dict], Optional[dict[int, dict]]]:
+    """
+    Translate a bulk update request into shared values or per-listing values.
+    
+    Raises:
+        HTTPException: If the request has no or conflicting changes
+    """
+    if (update_data.items is None) == (update_data.rule is None):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either items or a rule"
         )
     
-    if not listing.product_photo_url:
+    if update_data.items is not None:
+        if update_data.listing_ids is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Items already select listings; do not combine them with listing_ids"
+            )
+        values_by_id = {
+            item.id: item.model_dump(exclude_unset=True, exclude={"id"})
+            for item in update_data.items
+        }
+        changes = [values for values in values_by_id.values() if values]
+        if "status" in {column for values in changes for column in values}:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Status cannot be changed in bulk"
+            )
+        if not changes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No fields to update"
+            )
+        return None, {listing_id: values for listing_id, values in values_by_id.items() if values}
+    
+    rule = update_data.rule
+    values = rule.values.model_dump(exclude_unset=True) if rule.values else {}
+    if "status" in values:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Product photo URL is required"
+            detail="Status cannot be changed in bulk"
         )
     
-    # Update status
-    listing.status = ListingStatus.GENERATING_MEDIA
-    db.commit()
+    if rule.price_change_percent is not None or rule.price_change_amount is not None:
+        if "price" in values:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Set a price or change it, not both"
+            )
+        price = func.round(
+            Listing.price * (1 + (rule.price_change_percent or 0) / 100) + (rule.price_change_amount or 0),
+            2
+        )
+        values["price"] = case((price < 0, 0), else_=price)
     
-    # Trigger n8n workflow
-    try:
-        await n8n_client.trigger_media_generation(
-            listing_id=listing.id,
-            product_name=listing.title,
-            product_photo_url=listing.product_photo_url,
-            target_audience=listing.target_audience or "General audience",
-            product_features=listing.product_features or listing.description,
-            video_setting=listing.video_setting or "Casual indoor setting"
+    if rule.quantity_change is not None:
+        if "quantity" in values:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Set a quantity or change it, not both"
+            )
+        quantity = Listing.quantity + rule.quantity_change
+        values["quantity"] = case((quantity < 0, 0), else_=quantity)
+    
+    if not values:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
         )
-    except Exception as e:
-        listing.status = ListingStatus.ERROR
-        listing.error_message = str(e)
-        db.commit()
+    return values, None
+
+
+@router.post("/bulk-update", response_model=Union[BulkUpdateResponse, BulkJobResponse])
+async def bulk_update_listings(
+    update_data: BulkUpdateRequest,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Update listings with per-listing values or a rule, optionally as a background job."""
+    values, values_by_id = _bulk_update_values(update_data)
+    listing_ids = list(values_by_id) if values_by_id is not None else update_data.listing_ids
+    criteria = _filter_criteria(update_data.model_copy(update={"listing_ids": listing_ids}))
+    update_matching = partial(
+        update_listings,
+        user_id=current_user.id,
+        criteria=criteria,
+        listing_ids=listing_ids,
+        values=values,
+        values_by_id=values_by_id,
+        chunk_size=settings.bulk_chunk_size
+    )
+    
+    if not update_data.background:
+        published_ids = [] if update_data.revise_published else None
+        updated = await run_in_threadpool(update_matching, db, published_ids=published_ids)
+        revisions = await run_in_threadpool(collect_revisions, db, published_ids) if published_ids else {}
+        if revisions:
+            task = asyncio.create_task(
+                trigger_revisions(n8n_client, revisions, current_user.ebay_access_token)
+            )
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        
+        return BulkUpdateResponse(
+            updated=updated,
+            revised=sum(len(items) for items in revisions.values())
+        )
+    
+    total = await run_in_threadpool(count_listings, db, current_user.id, criteria, listing_ids)
+    job = await run_in_threadpool(create_job, db, current_user.id, "update", total)
+    
+    task = asyncio.create_task(_run_bulk_update_job(
+        current_user.shard_id,
+        job.id,
+        update_matching,
+        update_data.revise_published,
+        current_user.ebay_access_token
+    ))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
+    response.status_code = status.HTTP_202_ACCEPTED
+    return job
+
+
+async def _run_bulk_update_job(
+    shard_id: int,
+    job_id: str,
+    update_matching: partial,
+    revise_published: bool,
+    ebay_token: Optional[str]
+) -> None:
+    """Run a bulk update job, then revise the published listings it changed."""
+    session_factory = shard_sessions[shard_id]
+    published_ids = [] if revise_published else None
+    await run_in_threadpool(
+        run_job,
+        session_factory,
+        job_id,
+        partial(update_matching, published_ids=published_ids)
+    )
+    if not published_ids:
+        return
+    
+    db = session_factory()
+    try:
+        revisions = await run_in_threadpool(collect_revisions, db, published_ids)
+    finally:
+        db.close()
+    await trigger_revisions(n8n_client, revisions, ebay_token)
+
+
+@router.get("/bulk-jobs/{job_id}", response_model=BulkJobResponse)
+def get_bulk_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Get the progress of a bulk job, failing it if it has stopped making progress."""
+    job = db.query(BulkJob).filter(
+        BulkJob.id == job_id,
+        BulkJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to trigger media generation: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bulk job not found"
         )
     
-    db.refresh(listing)
-    return listing
+    if job.status == BulkJobStatus.RUNNING and reap_stale_jobs(db):
+        db.refresh(job)
+    
+    return job
 
 
-@router.post("/{listing_id}/approve-media", response_model=ListingResponse)
-def approve_media(
+@router.post(
+    "/{listing_id}/photo",
+    response_model=ListingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_product_photo(
     listing_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Approve generated media."""
+    """Upload a product photo and use it as the listing's product photo URL."""
     listing = db.query(Listing).filter(
         Listing.id == listing_id,
         Listing.user_id == current_user.id
@@ -194,75 +515,233 @@ def approve_media(
             detail="Listing not found"
         )
     
-    if listing.status != ListingStatus.MEDIA_READY:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Media is not ready for approval"
+    # The body is streamed to disk; it is never read into memory
+    try:
+        name = await media_storage.save_multipart(
+            request.stream(),
+            request.headers.get("content-type", "")
         )
+    except MediaUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    # Update status
-    listing.status = ListingStatus.APPROVED
+    listing.product_photo_url = media_url(name)
+    listing.version = Listing.version + 1
+    notify_listing_changed(db, current_user.id, listing.id)
     db.commit()
     db.refresh(listing)
     
     return listing
 
 
-@router.post("/{listing_id}/publish", response_model=ListingResponse)
-async def publish_listing(
+@router.get("/{listing_id}/media/{index}/{variant}")
+async def get_media_derivative(
     listing_id: int,
+    index: int,
+    variant: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_user_db)
 ):
-    """Trigger eBay publishing via n8n workflow."""
-    listing = db.query(Listing).filter(
-        Listing.id == listing_id,
+    """Get a resized derivative (thumbnail, card, full) of a listing image."""
+    media = db.query(Media).join(Listing).filter(
+        Media.listing_id == listing_id,
         Listing.user_id == current_user.id
     ).first()
     
-    if not listing:
+    image_urls = (media.image_urls or []) if media else []
+    if not 0 <= index < len(image_urls):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
+            detail="Image not found"
         )
     
-    if listing.status != ListingStatus.APPROVED:
+    try:
+        image = await thumbnail_cache.get(image_urls[index], variant)
+    except ThumbnailError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    return Response(
+        content=image,
+        media_type="image/webp",
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+
+@router.post("/{listing_id}/restore", response_model=ListingResponse)
+def restore_archived_listing(
+    listing_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Restore an archived listing."""
+    try:
+        listing = restore_listing(db, listing_id, current_user.id)
+    except RestoreConflictError as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing must be approved before publishing"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
         )
     
-    if not listing.media:
+    if not listing:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing must have media before publishing"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archived listing not found"
         )
     
+    return listing
+
+
+@router.post("/{listing_id}/generate-media", response_model=ListingResponse)
+async def generate_media(
+    listing_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Trigger media generation via n8n workflow."""
+    trace_id = uuid.uuid4().hex
+    
     # Update status
-    listing.status = ListingStatus.PUBLISHING
+    listing = apply_transition(
+        db,
+        listing_id,
+        MEDIA_GENERATION_SOURCES,
+        ListingStatus.GENERATING_MEDIA,
+        user_id=current_user.id,
+        criteria=[Listing.product_photo_url.isnot(None), Listing.product_photo_url != ""],
+        trace_id=trace_id,
+        reconcile_attempts=0
+    )
+    
+    if listing is None:
+        # Tell which check failed only on the failure path
+        current = db.query(Listing.product_photo_url).filter(
+            Listing.id == listing_id,
+            Listing.user_id == current_user.id
+        ).first()
+        
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Listing not found"
+            )
+        
+        if not current.product_photo_url:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Product photo URL is required"
+            )
+        
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Listing is already generating media or publishing"
+        )
+    
     db.commit()
     
     # Trigger n8n workflow
     try:
-        await n8n_client.trigger_ebay_publish(
+        await n8n_client.trigger_media_generation(
             listing_id=listing.id,
-            title=listing.title,
-            description=listing.enriched_description or listing.description,
-            category_id=listing.category_id,
-            condition_id=listing.condition_id,
-            price=listing.price,
-            quantity=listing.quantity,
-            image_urls=listing.media.image_urls or [],
-            ebay_token=current_user.ebay_access_token
+            product_name=listing.title,
+            product_photo_url=listing.product_photo_url,
+            target_audience=listing.target_audience or "General audience",
+            product_features=listing.product_features or listing.description,
+            video_setting=listing.video_setting or "Casual indoor setting",
+            trace_id=trace_id
         )
     except Exception as e:
-        listing.status = ListingStatus.ERROR
-        listing.error_message = str(e)
+        apply_transition(
+            db,
+            listing.id,
+            ListingStatus.GENERATING_MEDIA,
+            ListingStatus.ERROR,
+            trace_id=trace_id,
+            error_message=str(e)
+        )
         db.commit()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to trigger eBay publishing: {str(e)}"
+            detail=f"Failed to trigger media generation: {str(e)}"
+        )
+    
+    db.refresh(listing)
+    return listing
+
+
+@router.post("/{listing_id}/approve-media", response_model=ListingResponse)
+def approve_media(
+    listing_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Approve generated media."""
+    listing = transition_listing(
+        db,
+        listing_id,
+        ListingStatus.MEDIA_READY,
+        ListingStatus.APPROVED,
+        user_id=current_user.id,
+        conflict_detail="Media is not ready for approval"
+    )
+    db.commit()
+    
+    return listing
+
+
+@router.post("/{listing_id}/publish", response_model=ListingResponse)
+async def publish_listing(
+    listing_id: int,
+    publish_data: Optional[PublishRequest] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_user_db)
+):
+    """Publish a listing to its marketplace targets via n8n workflows."""
+    targets = settings.marketplace_webhooks_map
+    marketplaces = (publish_data.marketplaces if publish_data else None) or list(targets)
+    
+    unknown = sorted(set(marketplaces) - set(targets))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown marketplaces: {', '.join(unknown)}"
+        )
+    
+    trace_id = uuid.uuid4().hex
+    
+    # Update status
+    listing = transition_listing(
+        db,
+        listing_id,
+        ListingStatus.APPROVED,
+        ListingStatus.PUBLISHING,
+        user_id=current_user.id,
+        criteria=[Listing.media.has()],
+        trace_id=trace_id,
+        conflict_detail="Listing must be approved and have media before publishing",
+        reconcile_attempts=0
+    )
+    start_publications(db, listing, marketplaces, trace_id=trace_id)
+    
+    item = {
+        "listing_id": listing.id,
+        "title": listing.title,
+        "description": listing.enriched_description or listing.description,
+        "category_id": listing.category_id,
+        "condition_id": listing.condition_id,
+        "price": listing.price,
+        "quantity": listing.quantity,
+        "image_urls": listing.media.image_urls or [],
+        "trace_id": trace_id
+    }
+    db.commit()
+    
+    # Trigger n8n workflows without waiting on them; each target reports back
+    # through its own callback, or is marked failed on error or timeout
+    for marketplace in dict.fromkeys(marketplaces):
+        task = asyncio.create_task(
+            trigger_publication(n8n_client, marketplace, item, current_user.ebay_access_token)
         )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
     
     db.refresh(listing)
     return listing
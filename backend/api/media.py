@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+
+from core.config import settings
+from services.media_storage import MediaStorage
+from services.thumbnails import ThumbnailCache
+
+router = APIRouter(prefix="/media", tags=["media"])
+media_storage = MediaStorage(
+    root=settings.media_root,
+    max_upload_bytes=settings.media_max_upload_mb * 1024 * 1024
+)
+
+
+@router.get("/{name}")
+def get_media(name: str):
+    """Serve an uploaded media file (supports Range requests)."""
+    path = media_storage.path_for(name)
+    
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+    
+    # Files are content-addressed, so they never change
+    return FileResponse(
+        path,
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff"
+        }
+    )
+
+
+def media_url(name: str) -> str:
+    """Public URL for a stored media file."""
+    return f"{settings.backend_url}/media/{name}"
+
+
+def local_media_path(url: str) -> Optional[Path]:
+    """Resolve a URL served by this backend to the stored file, if any."""
+    prefix = f"{settings.backend_url}/media/"
+    if not url.startswith(prefix):
+        return None
+    return media_storage.path_for(url[len(prefix):])
+
+
+thumbnail_cache = ThumbnailCache(
+    root=settings.thumbnail_cache_root,
+    max_bytes=settings.thumbnail_cache_max_mb * 1024 * 1024,
+    max_source_bytes=settings.thumbnail_max_source_mb * 1024 * 1024,
+    resolve_local=local_media_path,
+    allowed_hosts=settings.thumbnail_source_hosts_list
+)
@@ -0,0 +1,62 @@
+from typing import Any, Iterable, NoReturn, Optional, Union
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from models import Listing, ListingStatus
+from services.transitions import apply_transition
+
+
+def transition_listing(
+    db: Session,
+    listing_id: int,
+    from_status: Union[ListingStatus, Iterable[ListingStatus]],
+    to_status: ListingStatus,
+    user_id: Optional[int] = None,
+    criteria: Iterable[Any] = (),
+    trace_id: Optional[str] = None,
+    conflict_detail: str = "Listing status changed concurrently",
+    **values: Any
+) -> Listing:
+    """
+    Apply a status transition, raising 404 or 409 when it does not match.
+    
+    The extra lookup to tell a missing listing from a conflict only runs
+    on the failure path.
+    """
+    listing = apply_transition(
+        db,
+        listing_id,
+        from_status,
+        to_status,
+        user_id=user_id,
+        criteria=criteria,
+        trace_id=trace_id,
+        **values
+    )
+    if listing is not None:
+        return listing
+    
+    raise_transition_error(db, listing_id, user_id=user_id, conflict_detail=conflict_detail)
+
+
+def raise_transition_error(
+    db: Session,
+    listing_id: int,
+    user_id: Optional[int] = None,
+    conflict_detail: str = "Listing status changed concurrently"
+) -> NoReturn:
+    """Raise 404 if the listing does not exist, otherwise 409."""
+    query = db.query(Listing.id).filter(Listing.id == listing_id)
+    if user_id is not None:
+        query = query.filter(Listing.user_id == user_id)
+    
+    if query.first() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Listing not found"
+        )
+    
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=conflict_detail
+    )
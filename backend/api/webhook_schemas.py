@@ -11,6 +11,7 @@ class MediaCompleteWebhook(BaseModel):
     assets: Optional[dict] = None  # {"image_url": "...", "video_url": "..."}
     prompts: Optional[dict] = None  # {"image_prompt": "...", "video_prompt": "..."}
     error_message: Optional[str] = None
+    trace_id: Optional[str] = None
     
     @property
     def success(self) -> bool:
@@ -33,3 +34,23 @@ class EbayPublishWebhook(BaseModel):
     success: bool = True
     error_message: Optional[str] = None
     fees: Optional[dict] = None
+    correlation_id: Optional[str] = None
+    trace_id: Optional[str] = None
+
+
+class EbayBatchPublishWebhook(BaseModel):
+    """Schema for batched eBay publishing completion webhook."""
+    batch_id: Optional[str] = None
+    results: List[EbayPublishWebhook]
+
+
+class MarketplacePublishWebhook(BaseModel):
+    """Schema for marketplace publishing completion webhook."""
+    listing_id: int
+    marketplace: str
+    success: bool = True
+    item_id: Optional[str] = None
+    url: Optional[str] = None
+    fees: Optional[dict] = None
+    error_message: Optional[str] = None
+    trace_id: Optional[str] = None
@@ -1,28 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Optional, Union
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.config import settings
+from core.database import shard_for_listing, shard_sessions
 from models import Listing, Media, PublishedListing, ListingStatus
-from .webhook_schemas import MediaCompleteWebhook, EbayPublishWebhook
+from .media import thumbnail_cache
+from .transitions import raise_transition_error, transition_listing
+from .webhook_schemas import (
+    MediaCompleteWebhook,
+    EbayPublishWebhook,
+    EbayBatchPublishWebhook,
+    MarketplacePublishWebhook,
+)
+from services.publications import finish_publication
+from services.write_batcher import GroupCommitWriter
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+# One group-commit writer per database shard
+webhook_writers = [
+    GroupCommitWriter(
+        max_batch=settings.webhook_group_commit_max_batch,
+        max_delay=settings.webhook_group_commit_max_delay_ms / 1000,
+        session_factory=session_factory
+    )
+    for session_factory in shard_sessions
+]
+_background_tasks: set[asyncio.Task] = set()
 
 
 @router.post("/media-complete")
-def handle_media_complete(
-    webhook_data: MediaCompleteWebhook,
-    db: Session = Depends(get_db)
-):
+async def handle_media_complete(webhook_data: MediaCompleteWebhook):
     """Handle media generation completion webhook from n8n."""
-    listing = db.query(Listing).filter(Listing.id == webhook_data.listing_id).first()
-    
-    if not listing:
+    # The listing ID picks the shard, so a callback without one matches nothing
+    if webhook_data.listing_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Listing not found"
         )
     
+    result = await _write(
+        partial(_apply_media_complete, webhook_data),
+        shard_for_listing(webhook_data.listing_id)
+    )
+    
+    # Render dashboard derivatives before the first page load asks for them
+    if settings.thumbnail_prewarm and webhook_data.success and webhook_data.image_url:
+        task = asyncio.create_task(thumbnail_cache.prewarm([webhook_data.image_url]))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    
+    return result
+
+
+@router.post("/ebay-complete")
+async def handle_ebay_complete(webhook_data: Union[EbayBatchPublishWebhook, EbayPublishWebhook]):
+    """Handle eBay publishing completion webhook from n8n."""
+    if isinstance(webhook_data, EbayBatchPublishWebhook):
+        return await _write_ebay_batch(webhook_data)
+    
+    return await _write(
+        partial(_apply_ebay_complete, webhook_data),
+        shard_for_listing(webhook_data.listing_id)
+    )
+
+
+@router.post("/publish-complete")
+async def handle_publish_complete(webhook_data: MarketplacePublishWebhook):
+    """Handle publishing completion webhook from a marketplace workflow."""
+    return await _write(
+        partial(_apply_publish_complete, webhook_data),
+        shard_for_listing(webhook_data.listing_id)
+    )
+
+
+async def _write(fn: Callable[[Session], dict], shard_id: int) -> dict:
+    """Apply a webhook write on a shard, through the group-commit writer when enabled."""
+    if settings.webhook_group_commit_enabled:
+        return await webhook_writers[shard_id].submit(fn)
+    
+    return await run_in_threadpool(_write_and_commit, fn, shard_id)
+
+
+def _write_and_commit(fn: Callable[[Session], dict], shard_id: int) -> dict:
+    """Apply a webhook write and commit it in its own session."""
+    db = shard_sessions[shard_id]()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+async def _write_ebay_batch(webhook_data: EbayBatchPublishWebhook) -> dict:
+    """Apply a batched eBay result, splitting it by the shard of each listing."""
+    by_shard = defaultdict(list)
+    for result in webhook_data.results:
+        by_shard[shard_for_listing(result.listing_id)].append(result)
+    
+    if len(by_shard) <= 1:
+        shard_id = next(iter(by_shard), 0)
+        return await _write(partial(_apply_ebay_batch_complete, webhook_data), shard_id)
+    
+    responses = await asyncio.gather(*(
+        _write(
+            partial(_apply_ebay_batch_complete, webhook_data.model_copy(update={"results": results})),
+            shard_id
+        )
+        for shard_id, results in by_shard.items()
+    ))
+    
+    # Report results in the order n8n sent them
+    shard_results = {
+        shard_id: iter(response["results"])
+        for shard_id, response in zip(by_shard, responses)
+    }
+    return {
+        **responses[0],
+        "results": [
+            next(shard_results[shard_for_listing(result.listing_id)])
+            for result in webhook_data.results
+        ]
+    }
+
+
+def _apply_media_complete(webhook_data: MediaCompleteWebhook, db: Session) -> dict:
+    """Record a media generation result without committing."""
     if webhook_data.success:
+        # Update listing status
+        listing = transition_listing(
+            db,
+            webhook_data.listing_id,
+            ListingStatus.GENERATING_MEDIA,
+            ListingStatus.MEDIA_READY,
+            trace_id=webhook_data.trace_id,
+            conflict_detail="Listing is not generating media",
+            error_message=None
+        )
+        
         # Create or update media record
         media = db.query(Media).filter(Media.listing_id == listing.id).first()
         
@@ -38,63 +158,138 @@ def handle_media_complete(
                 video_url=webhook_data.video_url
             )
             db.add(media)
-        
-        # Update listing status
-        listing.status = ListingStatus.MEDIA_READY
-        listing.error_message = None
     else:
         # Handle error
-        listing.status = ListingStatus.ERROR
-        listing.error_message = webhook_data.error_message or "Media generation failed"
-    
-    db.commit()
+        listing = transition_listing(
+            db,
+            webhook_data.listing_id,
+            ListingStatus.GENERATING_MEDIA,
+            ListingStatus.ERROR,
+            trace_id=webhook_data.trace_id,
+            conflict_detail="Listing is not generating media",
+            error_message=webhook_data.error_message or "Media generation failed"
+        )
     
     return {
         "status": "success",
         "message": "Media completion processed",
-        "listing_id": listing.id,
+        "listing_id": webhook_data.listing_id,
         "listing_status": listing.status.value
     }
 
 
-@router.post("/ebay-complete")
-def handle_ebay_complete(
-    webhook_data: EbayPublishWebhook,
-    db: Session = Depends(get_db)
-):
-    """Handle eBay publishing completion webhook from n8n."""
-    listing = db.query(Listing).filter(Listing.id == webhook_data.listing_id).first()
+def _apply_ebay_complete(webhook_data: EbayPublishWebhook, db: Session) -> dict:
+    """Record a single eBay publish result without committing."""
+    listing = _apply_ebay_result(webhook_data, db)
+    if listing is None:
+        raise_transition_error(db, webhook_data.listing_id, conflict_detail="Listing is not publishing")
     
-    if not listing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
-        )
+    return {
+        "status": "success",
+        "message": "eBay publish completion processed",
+        "listing_id": webhook_data.listing_id,
+        "listing_status": listing.status.value,
+        "ebay_item_id": webhook_data.ebay_item_id if webhook_data.success else None
+    }
+
+
+def _apply_ebay_batch_complete(webhook_data: EbayBatchPublishWebhook, db: Session) -> dict:
+    """Record per-item results of a batched eBay publish without committing."""
+    results = []
+    for result in webhook_data.results:
+        listing = _apply_ebay_result(result, db)
+        
+        if listing is None:
+            results.append({
+                "listing_id": result.listing_id,
+                "correlation_id": result.correlation_id,
+                "status": "error",
+                "message": "Listing not found, not publishing or correlation ID mismatch"
+            })
+            continue
+        
+        results.append({
+            "listing_id": listing.id,
+            "correlation_id": result.correlation_id,
+            "status": "success",
+            "listing_status": listing.status.value,
+            "ebay_item_id": result.ebay_item_id if result.success else None
+        })
     
-    if webhook_data.success:
-        # Create published listing record
-        published_listing = PublishedListing(
-            listing_id=listing.id,
-            ebay_item_id=webhook_data.ebay_item_id,
-            ebay_url=webhook_data.ebay_url,
-            ebay_fees=webhook_data.fees
-        )
-        db.add(published_listing)
+    return {
+        "status": "success",
+        "message": "eBay batch publish completion processed",
+        "batch_id": webhook_data.batch_id,
+        "results": results
+    }
+
+
+def _apply_ebay_result(result: EbayPublishWebhook, db: Session) -> Optional[Listing]:
+    """
+    Record an eBay publish result without committing.
+    
+    Returns the listing, or None if it was not found, not publishing to eBay,
+    or the result's correlation ID does not match the publish.
+    """
+    listing = finish_publication(
+        db,
+        result.listing_id,
+        "ebay",
+        success=result.success,
+        external_item_id=result.ebay_item_id,
+        external_url=result.ebay_url,
+        fees=result.fees,
+        error_message=result.error_message or "eBay publishing failed",
+        trace_id=result.trace_id,
+        correlation_id=result.correlation_id
+    )
+    
+    if listing is not None and result.success:
+        # Create or update published listing record
+        published_listing = db.query(PublishedListing).filter(
+            PublishedListing.listing_id == listing.id
+        ).first()
         
-        # Update listing status
-        listing.status = ListingStatus.PUBLISHED
-        listing.error_message = None
-    else:
-        # Handle error
-        listing.status = ListingStatus.ERROR
-        listing.error_message = webhook_data.error_message or "eBay publishing failed"
+        if published_listing:
+            published_listing.ebay_item_id = result.ebay_item_id
+            published_listing.ebay_url = result.ebay_url
+            published_listing.ebay_fees = result.fees
+        else:
+            published_listing = PublishedListing(
+                listing_id=listing.id,
+                ebay_item_id=result.ebay_item_id,
+                ebay_url=result.ebay_url,
+                ebay_fees=result.fees
+            )
+            db.add(published_listing)
     
-    db.commit()
+    return listing
+
+
+def _apply_publish_complete(webhook_data: MarketplacePublishWebhook, db: Session) -> dict:
+    """Record a marketplace publish result without committing."""
+    listing = finish_publication(
+        db,
+        webhook_data.listing_id,
+        webhook_data.marketplace,
+        success=webhook_data.success,
+        external_item_id=webhook_data.item_id,
+        external_url=webhook_data.url,
+        fees=webhook_data.fees,
+        error_message=webhook_data.error_message,
+        trace_id=webhook_data.trace_id
+    )
+    if listing is None:
+        raise_transition_error(
+            db,
+            webhook_data.listing_id,
+            conflict_detail=f"Listing is not publishing to {webhook_data.marketplace}"
+        )
     
     return {
         "status": "success",
-        "message": "eBay publish completion processed",
-        "listing_id": listing.id,
-        "listing_status": listing.status.value,
-        "ebay_item_id": webhook_data.ebay_item_id if webhook_data.success else None
+        "message": "Marketplace publish completion processed",
+        "listing_id": webhook_data.listing_id,
+        "marketplace": webhook_data.marketplace,
+        "listing_status": listing.status.value
     }
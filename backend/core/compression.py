@@ -0,0 +1,189 @@
+import gzip
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/xml", "text/")
+
+
+def supported_encodings() -> list[str]:
+    """Encodings this server can produce, in order of preference."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Pick a response encoding from an Accept-Encoding header.
+    
+    Returns:
+        "br", "gzip" or "identity"
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    
+    candidates = [
+        coding for coding in supported_encodings()
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return "identity"
+    return max(candidates, key=lambda coding: accepted.get(coding, accepted.get("*", 0.0)))
+
+
+def is_compressible(content_type: str) -> bool:
+    """Check whether a content type is worth compressing."""
+    content_type = content_type.lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+def compress_payload(data: bytes, encoding: str) -> bytes:
+    """Compress data with the given encoding and record size and CPU metrics."""
+    if encoding == "identity":
+        return data
+    
+    started = time.thread_time()
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=min(settings.compression_level, 11))
+    else:
+        compressed = gzip.compress(data, compresslevel=settings.compression_level, mtime=0)
+    cpu_seconds = time.thread_time() - started
+    
+    metrics.increment(f"compression.{encoding}.responses")
+    metrics.increment(f"compression.{encoding}.bytes_in", len(data))
+    metrics.increment(f"compression.{encoding}.bytes_out", len(compressed))
+    metrics.observe(f"compression.{encoding}.cpu_seconds", cpu_seconds)
+    if compressed:
+        metrics.observe(f"compression.{encoding}.ratio", len(data) / len(compressed))
+    
+    return compressed
+
+
+class CompressionMiddleware:
+    """
+    Compress JSON and text responses above a size threshold.
+    
+    Responses that already carry a Content-Encoding (such as precompressed
+    cached payloads), partial content and non-text media are passed through.
+    """
+    
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+        
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Buffers a single response and compresses it once complete."""
+    
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Message | None = None
+        self.passthrough = False
+        self.chunks: list[bytes] = []
+    
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] == 206
+                or not is_compressible(headers.get("content-type", ""))
+            )
+            if self.passthrough:
+                await self._send(message)
+            else:
+                self.start_message = message
+            return
+        
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        
+        self.chunks.append(message.get("body", b""))
+        if message.get("more_body", False):
+            return
+        
+        body = b"".join(self.chunks)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        vary = {value.strip().lower() for value in headers.get("vary", "").split(",")}
+        if "accept-encoding" not in vary:
+            headers.add_vary_header("Accept-Encoding")
+        
+        if len(body) >= self.minimum_size:
+            body = compress_payload(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+        
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": body})
+
+
+class PayloadCache:
+    """Thread-safe LRU cache of encoded response bodies, bounded by their total size."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[bytes, str]] = OrderedDict()
+    
+    def get(self, key: Hashable) -> tuple[bytes, str] | None:
+        """Return the cached (body, encoding) for key, if any."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key: Hashable, body: bytes, encoding: str) -> None:
+        """Store an encoded body, evicting least recently used entries (bodies over the bound are not stored)."""
+        if len(body) > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (body, encoding)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
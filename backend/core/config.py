@@ -1,5 +1,15 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Databases whose listing ID sequence can be started at a shard's range
+SHARDABLE_DIALECTS = ("sqlite", "postgresql")
+
+# Database URL schemes change notifications can travel over: LISTEN/NOTIFY on
+# PostgreSQL with psycopg2, or a change log polled by ID on SQLite, whose
+# single writer commits IDs in order (other databases can commit them out of
+# order, and a poller would skip events)
+EVENT_SCHEMES = ("sqlite", "postgresql", "postgresql+psycopg2")
+
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -7,6 +17,13 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./bnb.db"
     
+    # Extra databases for user-partitioned sharding, as comma-separated URLs.
+    # database_url is shard 0 and also holds the users directory
+    shard_database_urls: str = ""
+    # Wait between blocking a user's requests and moving their rows, so
+    # requests already under way can finish
+    rebalance_drain_seconds: float = 10.0
+    
     # JWT
     secret_key: str
     algorithm: str = "HS256"
@@ -16,6 +33,78 @@ class Settings(BaseSettings):
     n8n_media_generation_webhook: str
     n8n_ebay_publish_webhook: str
     
+    # Extra marketplace publish workflows as comma-separated name=url pairs
+    # (eBay always uses n8n_ebay_publish_webhook)
+    marketplace_webhooks: str = ""
+    marketplace_publish_timeout_seconds: float = 30.0
+    
+    # eBay batch publishing (batch size <= 1 disables batching)
+    ebay_publish_batch_size: int = 1
+    ebay_publish_batch_window_seconds: float = 2.0
+    
+    # Archival of old listings (age in days; 0 disables a category)
+    archive_enabled: bool = False
+    archive_published_after_days: int = 90
+    archive_draft_after_days: int = 180
+    archive_batch_size: int = 200
+    archive_interval_seconds: float = 3600.0
+    
+    # Response compression
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    listings_payload_cache_mb: int = 64
+    
+    # Group commit for webhook writes
+    webhook_group_commit_enabled: bool = False
+    webhook_group_commit_max_batch: int = 100
+    webhook_group_commit_max_delay_ms: float = 5.0
+    
+    # Uploaded media storage
+    media_root: str = "./media"
+    media_max_upload_mb: int = 20
+    
+    # Resized media derivative cache
+    thumbnail_cache_root: str = "./media_cache"
+    thumbnail_cache_max_mb: int = 512
+    thumbnail_max_source_mb: int = 25
+    thumbnail_prewarm: bool = False
+    # Hosts remote source images may be fetched from, comma-separated
+    # (images uploaded to this backend are always read from disk)
+    thumbnail_source_hosts: str = ""
+    
+    # Reconciliation of listings stuck waiting for n8n callbacks
+    reconciler_enabled: bool = False
+    reconciler_interval_seconds: float = 300.0
+    reconciler_stuck_after_minutes: int = 30
+    reconciler_max_attempts: int = 3
+    reconciler_batch_size: int = 100
+    reconciler_max_retriggers_per_sweep: int = 20
+    
+    # Cross-worker change notifications for cache invalidation (LISTEN/NOTIFY
+    # on PostgreSQL with psycopg2, a polled change_events table on SQLite)
+    events_enabled: bool = False
+    events_poll_interval_ms: float = 200.0
+    events_retention_minutes: int = 10
+    user_cache_size: int = 1024
+    
+    # Bulk listing operations (listings per statement and commit)
+    bulk_chunk_size: int = 500
+    # Running jobs without progress for this long are marked failed
+    bulk_job_stale_after_minutes: int = 30
+    
+    # Load shedding by queueing delay (0 disables a threshold or cap;
+    # webhooks are never shed)
+    load_shedding_enabled: bool = False
+    load_shedding_probe_interval_ms: float = 100.0
+    load_shedding_reads_delay_ms: float = 200.0
+    load_shedding_auth_delay_ms: float = 1000.0
+    load_shedding_writes_delay_ms: float = 0.0
+    load_shedding_reads_max_in_flight: int = 0
+    load_shedding_retry_after_seconds: int = 2
+    
+    # Bearer token for GET /metrics (the endpoint is hidden when unset)
+    metrics_token: str = ""
+    
     # Backend URL
     backend_url: str = "http://localhost:8000"
     
@@ -27,6 +116,51 @@ class Settings(BaseSettings):
         case_sensitive=False
     )
     
+    @model_validator(mode="after")
+    def check_shard_dialects(self) -> "Settings":
+        """Refuse sharding on databases whose listing IDs cannot be seeded per shard."""
+        if len(self.shard_urls) > 1:
+            for url in self.shard_urls:
+                dialect = url.split(":", 1)[0].split("+", 1)[0]
+                if dialect not in SHARDABLE_DIALECTS:
+                    raise ValueError(
+                        f"Sharding supports {', '.join(SHARDABLE_DIALECTS)} databases, not {dialect}"
+                    )
+        return self
+    
+    @model_validator(mode="after")
+    def check_event_schemes(self) -> "Settings":
+        """Refuse change notifications on databases they cannot be delivered reliably over."""
+        if self.events_enabled:
+            for url in self.shard_urls:
+                scheme = url.split(":", 1)[0]
+                if scheme not in EVENT_SCHEMES:
+                    raise ValueError(
+                        f"Change notifications need SQLite or PostgreSQL with psycopg2, not {scheme}"
+                    )
+        return self
+    
+    @property
+    def marketplace_webhooks_map(self) -> dict[str, str]:
+        """Publish webhook URL per marketplace target."""
+        targets = {"ebay": self.n8n_ebay_publish_webhook}
+        for pair in self.marketplace_webhooks.split(","):
+            name, _, url = pair.partition("=")
+            if name.strip() and url.strip():
+                targets[name.strip().lower()] = url.strip()
+        return targets
+    
+    @property
+    def thumbnail_source_hosts_list(self) -> list[str]:
+        """Convert comma-separated thumbnail source hosts to list."""
+        return [host.strip() for host in self.thumbnail_source_hosts.split(",") if host.strip()]
+    
+    @property
+    def shard_urls(self) -> list[str]:
+        """Database URL of each shard, starting with the primary database."""
+        extra = [url.strip() for url in self.shard_database_urls.split(",") if url.strip()]
+        return [self.database_url] + extra
+    
     @property
     def cors_origins_list(self) -> list[str]:
         """Convert comma-separated CORS origins to list."""
@@ -1,15 +1,31 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, literal, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Listing IDs of shard N start at N * SHARD_ID_RANGE, so the shard holding a
+# listing can be read from its ID (shard 0 keeps the IDs it always had)
+SHARD_ID_RANGE = 2 ** 40
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _create_engine(url: str):
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {}
+    )
+
+
+# Shard 0 is the primary database, which also holds the users directory
+engines = [_create_engine(url) for url in settings.shard_urls]
+engine = engines[0]
+
+shard_sessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+    for shard_engine in engines
+]
+SessionLocal = shard_sessions[0]
 
 Base = declarative_base()
 
@@ -21,3 +37,103 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def shard_for_new_user(user_id: int) -> int:
+    """Pick the home shard of a new user (a stable hash of the user ID)."""
+    return user_id % len(engines)
+
+
+def shard_for_listing(listing_id: int) -> int:
+    """Shard holding a listing, decoded from its ID."""
+    shard_id = listing_id // SHARD_ID_RANGE
+    return shard_id if 0 <= shard_id < len(engines) else 0
+
+
+def init_shards() -> None:
+    """Create or upgrade tables on every shard and start each shard's listing IDs in its range."""
+    for shard_id, shard_engine in enumerate(engines):
+        Base.metadata.create_all(bind=shard_engine)
+        with shard_engine.begin() as conn:
+            upgrade_tables(conn)
+            seed_listing_ids(conn, shard_id)
+
+
+def upgrade_tables(conn: Connection) -> None:
+    """
+    Add columns and indexes missing from tables created by an older version.
+    
+    create_all never alters an existing table. New columns must be nullable
+    or have a constant default, which existing rows are filled with.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                add_column(conn, column)
+        
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=conn)
+
+
+def add_column(conn: Connection, column) -> None:
+    """Add a model column to its existing table, filling existing rows with its default."""
+    preparer = conn.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(column.table)} "
+        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}"
+    )
+    
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        rendered = literal(default, column.type).compile(
+            dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {rendered}"
+    if not column.nullable:
+        if default is None:
+            raise RuntimeError(
+                f"Cannot add NOT NULL column {column.table.name}.{column.name} without a constant default"
+            )
+        ddl += " NOT NULL"
+    
+    conn.execute(text(ddl))
+
+
+def seed_listing_ids(conn: Connection, shard_id: int) -> None:
+    """
+    Move a shard's listing ID sequence to the start of its range if it is below it.
+    
+    Settings only allow sharding on SQLite and PostgreSQL.
+    """
+    low = shard_id * SHARD_ID_RANGE
+    if low == 0:
+        return
+    
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        current = conn.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = 'listings'")
+        ).scalar()
+    else:
+        current = conn.execute(
+            text("SELECT last_value FROM pg_sequences WHERE sequencename = 'listings_id_seq'")
+        ).scalar()
+    
+    if current is not None and current >= low:
+        return
+    
+    if dialect == "sqlite":
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'listings'"))
+        conn.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES ('listings', :seq)"),
+            {"seq": low}
+        )
+    else:
+        conn.execute(
+            text("SELECT setval(pg_get_serial_sequence('listings', 'id'), :seq)"),
+            {"seq": low}
+        )
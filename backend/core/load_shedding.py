@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Optional
+
+import anyio.to_thread
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.metrics import metrics
+
+# Paths that are never shed or tracked
+EXEMPT_PATHS = {"/", "/health", "/metrics"}
+
+
+def classify_request(method: str, path: str) -> str:
+    """
+    Map a request to its route class.
+    
+    Returns:
+        "webhooks", "auth", "reads" (listing polls, media, analytics) or "writes"
+    """
+    if path.startswith("/webhooks"):
+        return "webhooks"
+    if path.startswith("/auth"):
+        return "auth"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    return "writes"
+
+
+def _noop() -> None:
+    pass
+
+
+class QueueDelayMonitor:
+    """
+    Estimate how long requests wait before they get to run.
+    
+    A probe periodically measures event loop lag and the time a no-op takes
+    to get a threadpool worker, which is where sync endpoints queue. The
+    larger of the two is smoothed into a moving average. While a probe is
+    still waiting its elapsed time counts too, so a saturated pool is noticed
+    before the probe returns.
+    """
+    
+    def __init__(self, interval: float = 0.1, smoothing: float = 0.3):
+        self.interval = interval
+        self.smoothing = smoothing
+        self._delay = 0.0
+        self._probe_started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def delay(self) -> float:
+        """Current queueing delay estimate in seconds."""
+        if self._probe_started is not None:
+            return max(self._delay, time.perf_counter() - self._probe_started)
+        return self._delay
+    
+    def ensure_running(self) -> None:
+        """Start the probe task on the running loop if it is not running."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the probe task."""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        self._task = None
+        self._probe_started = None
+    
+    async def _run(self) -> None:
+        """Sample loop lag and threadpool wait every interval."""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            loop_lag = time.perf_counter() - started - self.interval
+            
+            self._probe_started = time.perf_counter()
+            await anyio.to_thread.run_sync(_noop)
+            pool_wait = time.perf_counter() - self._probe_started
+            self._probe_started = None
+            
+            sample = max(loop_lag, pool_wait, 0.0)
+            self._delay += self.smoothing * (sample - self._delay)
+            metrics.observe("load_shedding.queue_delay_seconds", sample)
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject low-priority requests with 503 while requests are queueing.
+    
+    Each route class has a queueing delay threshold above which its requests
+    are shed, and optionally a cap on requests in flight. Classes without a
+    threshold (webhooks, and writes by default) are always admitted.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        monitor: QueueDelayMonitor,
+        delay_thresholds: dict[str, float],
+        max_in_flight: Optional[dict[str, int]] = None,
+        retry_after: int = 2
+    ):
+        self.app = app
+        self.monitor = monitor
+        self.delay_thresholds = {name: value for name, value in delay_thresholds.items() if value > 0}
+        self.max_in_flight = {name: value for name, value in (max_in_flight or {}).items() if value > 0}
+        self.retry_after = retry_after
+        self._in_flight: dict[str, int] = defaultdict(int)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        self.monitor.ensure_running()
+        route_class = classify_request(scope["method"], scope["path"])
+        
+        if self._should_shed(route_class):
+            metrics.increment(f"load_shedding.{route_class}.shed")
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        
+        metrics.increment(f"load_shedding.{route_class}.admitted")
+        self._in_flight[route_class] += 1
+        metrics.set_gauge(f"load_shedding.{route_class}.in_flight", self._in_flight[route_class])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight[route_class] -= 1
+            metrics.set_gauge(f"load_shedding.{route_class}.in_flight", self._in_flight[route_class])
+    
+    def _should_shed(self, route_class: str) -> bool:
+        """Check the class's delay threshold and in-flight cap."""
+        threshold = self.delay_thresholds.get(route_class)
+        if threshold is not None and self.monitor.delay > threshold:
+            return True
+        
+        limit = self.max_in_flight.get(route_class)
+        return limit is not None and self._in_flight[route_class] >= limit
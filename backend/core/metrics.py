@@ -0,0 +1,49 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """Thread-safe in-process counters, gauges and summaries."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._summaries: dict[str, dict[str, float]] = {}
+    
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to a counter."""
+        with self._lock:
+            self._counters[name] += value
+    
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[name] = value
+    
+    def observe(self, name: str, value: float) -> None:
+        """Record an observation (duration, size, ratio) in a summary."""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "min": value, "max": value}
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+    
+    def snapshot(self) -> dict:
+        """Return a copy of all counters, gauges and summaries."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {
+                    name: {**summary, "avg": summary["sum"] / summary["count"]}
+                    for name, summary in self._summaries.items()
+                }
+            }
+
+
+metrics = Metrics()
@@ -1,20 +1,74 @@
-from fastapi import FastAPI
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.compression import CompressionMiddleware
 from core.config import settings
-from core.database import engine, Base
-from api import auth, listings, webhooks
+from core.load_shedding import LoadSheddingMiddleware, QueueDelayMonitor
+from core.metrics import metrics
+from core.database import init_shards
+from api import analytics, auth, listings, media, webhooks
+from services.archive import run_archiver
+from services.bulk import reap_all_stale_jobs
+from services.events import change_bus
+from services.reconciler import run_reconciler
+
+# Create database tables on every shard
+init_shards()
+
+queue_monitor = QueueDelayMonitor(interval=settings.load_shedding_probe_interval_ms / 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background jobs."""
+    # Fail bulk jobs left running by workers that have since died
+    await asyncio.to_thread(reap_all_stale_jobs)
+    
+    tasks = []
+    if settings.events_enabled:
+        tasks.append(asyncio.create_task(change_bus.run()))
+    if settings.archive_enabled:
+        tasks.append(asyncio.create_task(run_archiver()))
+    if settings.reconciler_enabled:
+        tasks.append(asyncio.create_task(run_reconciler(listings.n8n_client)))
+    
+    yield
+    
+    for task in tasks:
+        task.cancel()
+    for writer in webhooks.webhook_writers:
+        await writer.stop()
+    await queue_monitor.stop()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="BnB API",
     description="Brand in Box - AI-powered marketplace listing platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Shed low-priority requests under load (added first so that shed
+# responses still carry CORS headers)
+if settings.load_shedding_enabled:
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        monitor=queue_monitor,
+        delay_thresholds={
+            "reads": settings.load_shedding_reads_delay_ms / 1000,
+            "auth": settings.load_shedding_auth_delay_ms / 1000,
+            "writes": settings.load_shedding_writes_delay_ms / 1000,
+        },
+        max_in_flight={"reads": settings.load_shedding_reads_max_in_flight},
+        retry_after=settings.load_shedding_retry_after_seconds
+    )
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,10 +78,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON responses
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(listings.router)
 app.include_router(webhooks.router)
+app.include_router(media.router)
+app.include_router(analytics.router)
 
 
 @app.get("/")
@@ -46,6 +105,29 @@ def health_check():
     return {"status": "healthy"}
 
 
+def require_metrics_token(
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))
+) -> None:
+    """Allow only scrapers presenting METRICS_TOKEN."""
+    if not settings.metrics_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    
+    if credentials is None or not secrets.compare_digest(credentials.credentials, settings.metrics_token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token"
+        )
+
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])
+def get_metrics():
+    """In-process metrics snapshot."""
+    return metrics.snapshot()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
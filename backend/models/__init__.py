@@ -1,3 +1,29 @@
-from .models import User, Listing, Media, PublishedListing, ListingStatus
+from .models import (
+    User,
+    Listing,
+    Media,
+    PublishedListing,
+    MarketplacePublication,
+    ListingStatus,
+    PublicationStatus,
+    ArchivedListing,
+    ListingStatusHistory,
+    BulkJob,
+    BulkJobStatus,
+    ChangeEvent,
+)
 
-__all__ = ["User", "Listing", "Media", "PublishedListing", "ListingStatus"]
+__all__ = [
+    "User",
+    "Listing",
+    "Media",
+    "PublishedListing",
+    "MarketplacePublication",
+    "ListingStatus",
+    "PublicationStatus",
+    "ArchivedListing",
+    "ListingStatusHistory",
+    "BulkJob",
+    "BulkJobStatus",
+    "ChangeEvent",
+]
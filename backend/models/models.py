@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON, ForeignKey, Enum, LargeBinary, Index, UniqueConstraint, Boolean
 from sqlalchemy.orm import relationship
 import enum
 
@@ -17,6 +17,20 @@ class ListingStatus(str, enum.Enum):
     ERROR = "error"
 
 
+class PublicationStatus(str, enum.Enum):
+    """Per-marketplace publication status enumeration."""
+    PUBLISHING = "publishing"
+    PUBLISHED = "published"
+    ERROR = "error"
+
+
+class BulkJobStatus(str, enum.Enum):
+    """Bulk job status enumeration."""
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class User(Base):
     """User model."""
     __tablename__ = "users"
@@ -25,15 +39,30 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     ebay_access_token = Column(String, nullable=True)
+    
+    # Shard holding the user's listings; only authoritative on the primary
+    # database, where it acts as the shard lookup table
+    shard_id = Column(Integer, default=0, nullable=False)
+    # Set while the user's rows are moved to another shard, blocking their
+    # listing requests
+    moving = Column(Boolean, default=False, nullable=False)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     listings = relationship("Listing", back_populates="user", cascade="all, delete-orphan")
+    archived_listings = relationship("ArchivedListing", back_populates="user", cascade="all, delete-orphan")
 
 
 class Listing(Base):
     """Listing model."""
     __tablename__ = "listings"
+    __table_args__ = (
+        # Lets the reconciler find listings stuck in a status
+        Index("ix_listings_status_updated_at", "status", "updated_at"),
+        # Never reuse IDs of archived listings on SQLite
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -59,6 +88,12 @@ class Listing(Base):
     status = Column(Enum(ListingStatus), default=ListingStatus.DRAFT, nullable=False)
     error_message = Column(Text, nullable=True)
     
+    # Optimistic concurrency version, bumped on every status transition
+    version = Column(Integer, default=1, nullable=False)
+    
+    # Re-triggers of the current n8n workflow by the reconciler
+    reconcile_attempts = Column(Integer, default=0, nullable=False)
+    
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -67,6 +102,7 @@ class Listing(Base):
     user = relationship("User", back_populates="listings")
     media = relationship("Media", back_populates="listing", uselist=False, cascade="all, delete-orphan")
     published_listing = relationship("PublishedListing", back_populates="listing", uselist=False, cascade="all, delete-orphan")
+    publications = relationship("MarketplacePublication", back_populates="listing", cascade="all, delete-orphan")
 
 
 class Media(Base):
@@ -105,3 +141,112 @@ class PublishedListing(Base):
     
     # Relationships
     listing = relationship("Listing", back_populates="published_listing")
+
+
+class MarketplacePublication(Base):
+    """Publish status of a listing on one marketplace target."""
+    __tablename__ = "marketplace_publications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False, index=True)
+    marketplace = Column(String(50), nullable=False)
+    
+    status = Column(Enum(PublicationStatus), default=PublicationStatus.PUBLISHING, nullable=False)
+    error_message = Column(Text, nullable=True)
+    trace_id = Column(String(64), nullable=True)
+    
+    # Marketplace details
+    external_item_id = Column(String, nullable=True)
+    external_url = Column(String, nullable=True)
+    fees = Column(JSON, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    published_at = Column(DateTime, nullable=True)
+    
+    # Relationships
+    listing = relationship("Listing", back_populates="publications")
+    
+    __table_args__ = (
+        UniqueConstraint("listing_id", "marketplace", name="uq_marketplace_publications_listing_marketplace"),
+    )
+
+
+class ArchivedListing(Base):
+    """Archived listing model (cold storage for old listings)."""
+    __tablename__ = "archived_listings"
+    
+    # Same ID as the original listing
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    
+    # Summary columns kept uncompressed
+    title = Column(String(255), nullable=False)
+    status = Column(Enum(ListingStatus), nullable=False)
+    
+    # zlib-compressed JSON of the listing with its media and published listing
+    data = Column(LargeBinary, nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Relationships
+    user = relationship("User", back_populates="archived_listings")
+
+
+class ListingStatusHistory(Base):
+    """Listing status transition log, used for pipeline stage timing."""
+    __tablename__ = "listing_status_history"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign keys: history outlives archived and deleted listings
+    listing_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    
+    status = Column(Enum(ListingStatus), nullable=False)
+    trace_id = Column(String(64), nullable=True, index=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_listing_status_history_user_created", "user_id", "created_at"),
+    )
+
+
+class BulkJob(Base):
+    """Progress of a bulk listing operation run in the background."""
+    __tablename__ = "bulk_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)
+    
+    status = Column(Enum(BulkJobStatus), default=BulkJobStatus.RUNNING, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    processed = Column(Integer, default=0, nullable=False)
+    error_message = Column(Text, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ChangeEvent(Base):
+    """Listing and user change log, polled by workers that cannot LISTEN."""
+    __tablename__ = "change_events"
+    
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    listing_id = Column(Integer, nullable=True)
+    # Worker that made the change, which has already applied it locally
+    origin = Column(String(32), nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    # IDs must never be reused, or pollers could miss events
+    __table_args__ = {"sqlite_autoincrement": True}
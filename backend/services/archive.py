@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, or_, tuple_, update
+from sqlalchemy.orm import Session, selectinload
+
+from core.config import settings
+from core.database import shard_sessions
+from models import (
+    User,
+    Listing,
+    Media,
+    PublishedListing,
+    MarketplacePublication,
+    ListingStatus,
+    PublicationStatus,
+    ArchivedListing,
+)
+from services.events import notify_listing_changed
+
+logger = logging.getLogger(__name__)
+
+
+class RestoreConflictError(Exception):
+    """Raised when an archived listing's ID has been taken by another listing."""
+
+
+LISTING_FIELDS = [
+    "id", "user_id", "title", "description", "category_id", "price", "quantity",
+    "condition_id", "product_photo_url", "target_audience", "product_features",
+    "video_setting", "enriched_description", "status", "error_message", "version", "reconcile_attempts",
+    "created_at", "updated_at",
+]
+MEDIA_FIELDS = ["id", "listing_id", "image_urls", "video_url", "created_at", "updated_at"]
+PUBLISHED_FIELDS = ["id", "listing_id", "ebay_item_id", "ebay_url", "ebay_fees", "published_at"]
+PUBLICATION_FIELDS = [
+    "id", "listing_id", "marketplace", "status", "error_message", "trace_id",
+    "external_item_id", "external_url", "fees", "created_at", "updated_at", "published_at",
+]
+DATETIME_FIELDS = {"created_at", "updated_at", "published_at"}
+
+
+def _to_dict(obj, fields: list[str]) -> dict:
+    """Serialize model columns to JSON-safe values."""
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, (ListingStatus, PublicationStatus)):
+            value = value.value
+        data[field] = value
+    return data
+
+
+def _from_dict(data: dict, status_enum: type = ListingStatus) -> dict:
+    """Parse datetime and status values from archived JSON."""
+    parsed = dict(data)
+    for field in DATETIME_FIELDS & parsed.keys():
+        if parsed[field] is not None:
+            parsed[field] = datetime.fromisoformat(parsed[field])
+    if "status" in parsed:
+        parsed["status"] = status_enum(parsed["status"])
+    return parsed
+
+
+def compress_listing(listing: Listing) -> bytes:
+    """Compress a listing with its media and published listing."""
+    payload = _to_dict(listing, LISTING_FIELDS)
+    payload["media"] = _to_dict(listing.media, MEDIA_FIELDS) if listing.media else None
+    payload["published_listing"] = (
+        _to_dict(listing.published_listing, PUBLISHED_FIELDS) if listing.published_listing else None
+    )
+    payload["publications"] = [
+        _to_dict(publication, PUBLICATION_FIELDS) for publication in listing.publications
+    ]
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decompress_listing(archived: ArchivedListing) -> dict:
+    """Decompress an archived listing into a ListingResponse-shaped dict."""
+    payload = json.loads(zlib.decompress(archived.data).decode("utf-8"))
+    listing = _from_dict(payload)
+    if payload["media"]:
+        listing["media"] = _from_dict(payload["media"])
+    if payload["published_listing"]:
+        listing["published_listing"] = _from_dict(payload["published_listing"])
+    listing["publications"] = [
+        _from_dict(publication, PublicationStatus) for publication in payload.get("publications", [])
+    ]
+    return listing
+
+
+def archive_record(listing: Listing) -> ArchivedListing:
+    """Build the archive row of a listing with its media and publications loaded."""
+    return ArchivedListing(
+        id=listing.id,
+        user_id=listing.user_id,
+        title=listing.title,
+        status=listing.status,
+        data=compress_listing(listing),
+        created_at=listing.created_at,
+        updated_at=listing.updated_at,
+    )
+
+
+def listing_from_archive(archived: ArchivedListing) -> Listing:
+    """Rebuild a transient listing with its media and publications from the archive."""
+    data = decompress_listing(archived)
+    media = data.pop("media", None)
+    published_listing = data.pop("published_listing", None)
+    publications = data.pop("publications", [])
+    
+    listing = Listing(**data)
+    if media:
+        listing.media = Media(**media)
+    if published_listing:
+        listing.published_listing = PublishedListing(**published_listing)
+    listing.publications = [MarketplacePublication(**publication) for publication in publications]
+    return listing
+
+
+def _archive_criteria(now: datetime) -> list:
+    """Build WHERE clauses matching listings due for archival."""
+    criteria = []
+    if settings.archive_published_after_days > 0:
+        cutoff = now - timedelta(days=settings.archive_published_after_days)
+        criteria.append(
+            (Listing.status == ListingStatus.PUBLISHED) & (Listing.updated_at < cutoff)
+        )
+    if settings.archive_draft_after_days > 0:
+        cutoff = now - timedelta(days=settings.archive_draft_after_days)
+        criteria.append(
+            (Listing.status == ListingStatus.DRAFT) & (Listing.updated_at < cutoff)
+        )
+    return criteria
+
+
+def archive_batch(db: Session, batch_size: int, now: Optional[datetime] = None) -> int:
+    """
+    Move one batch of old listings into the archive table.
+    
+    Selected listings are claimed with an UPDATE that re-checks the age
+    criteria and their version, so a listing changed since it was read is
+    left alone rather than archived with its change lost.
+    
+    Args:
+        db: Database session
+        batch_size: Maximum number of listings to archive
+        now: Reference time for age cutoffs (defaults to utcnow)
+    
+    Returns:
+        Number of listings archived
+    """
+    criteria = _archive_criteria(now or datetime.utcnow())
+    if not criteria:
+        return 0
+    # Leave users being moved to another shard alone
+    not_moving = ~Listing.user.has(User.moving)
+    
+    listings = (
+        db.query(Listing)
+        .options(
+            selectinload(Listing.media),
+            selectinload(Listing.published_listing),
+            selectinload(Listing.publications)
+        )
+        .filter(or_(*criteria), not_moving)
+        .order_by(Listing.updated_at)
+        .limit(batch_size)
+        .all()
+    )
+    if not listings:
+        return 0
+    
+    claimed = set(db.scalars(
+        update(Listing)
+        .where(
+            tuple_(Listing.id, Listing.version).in_([(listing.id, listing.version) for listing in listings]),
+            or_(*criteria),
+            not_moving
+        )
+        .values(version=Listing.version + 1)
+        .returning(Listing.id),
+        execution_options={"synchronize_session": False}
+    ))
+    listings = [listing for listing in listings if listing.id in claimed]
+    if not listings:
+        db.commit()
+        return 0
+    
+    db.add_all([archive_record(listing) for listing in listings])
+    
+    listing_ids = [listing.id for listing in listings]
+    user_ids = {listing.user_id for listing in listings}
+    db.flush()
+    db.expunge_all()
+    db.execute(delete(Media).where(Media.listing_id.in_(listing_ids)))
+    db.execute(delete(PublishedListing).where(PublishedListing.listing_id.in_(listing_ids)))
+    db.execute(delete(MarketplacePublication).where(MarketplacePublication.listing_id.in_(listing_ids)))
+    db.execute(delete(Listing).where(Listing.id.in_(listing_ids)))
+    for user_id in user_ids:
+        notify_listing_changed(db, user_id)
+    db.commit()
+    
+    return len(listing_ids)
+
+
+def archive_listings(db: Session, batch_size: Optional[int] = None) -> int:
+    """Archive all due listings in batches, committing after each batch."""
+    batch_size = batch_size or settings.archive_batch_size
+    total = 0
+    while True:
+        archived = archive_batch(db, batch_size)
+        total += archived
+        if archived < batch_size:
+            return total
+
+
+def get_archived_listing(db: Session, listing_id: int, user_id: int) -> Optional[dict]:
+    """Get an archived listing as a ListingResponse-shaped dict."""
+    archived = db.query(ArchivedListing).filter(
+        ArchivedListing.id == listing_id,
+        ArchivedListing.user_id == user_id
+    ).first()
+    
+    if not archived:
+        return None
+    
+    return decompress_listing(archived)
+
+
+def restore_listing(db: Session, listing_id: int, user_id: int) -> Optional[Listing]:
+    """
+    Move an archived listing back into the hot tables.
+    
+    Returns:
+        The restored listing, or None if no archived listing matched
+    
+    Raises:
+        RestoreConflictError: If a listing already uses the archived ID, which
+            can happen on SQLite tables created before IDs stopped being reused
+    """
+    archived = db.query(ArchivedListing).filter(
+        ArchivedListing.id == listing_id,
+        ArchivedListing.user_id == user_id
+    ).first()
+    
+    if not archived:
+        return None
+    
+    if db.get(Listing, listing_id) is not None:
+        raise RestoreConflictError(f"Listing ID {listing_id} is already in use")
+    
+    listing = listing_from_archive(archived)
+    # Restoring counts as a change, so the archiver doesn't take it back at once
+    listing.updated_at = datetime.utcnow()
+    listing.version = (listing.version or 0) + 1
+    db.delete(archived)
+    db.add(listing)
+    notify_listing_changed(db, user_id, listing_id)
+    db.commit()
+    db.refresh(listing)
+    
+    return listing
+
+
+async def run_archiver() -> None:
+    """Periodically archive old listings in the background."""
+    while True:
+        try:
+            archived = await asyncio.to_thread(_archive_in_session)
+            if archived:
+                logger.info("Archived %d listings", archived)
+        except Exception:
+            logger.exception("Listing archival failed")
+        
+        await asyncio.sleep(settings.archive_interval_seconds)
+
+
+def _archive_in_session() -> int:
+    """Run a full archival pass on every shard with dedicated sessions."""
+    archived = 0
+    for session_factory in shard_sessions:
+        db = session_factory()
+        try:
+            archived += archive_listings(db)
+        finally:
+            db.close()
+    return archived
@@ -0,0 +1,278 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator, Optional
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from core.config import settings
+from core.database import shard_sessions
+from models import (
+    BulkJob,
+    BulkJobStatus,
+    Listing,
+    ListingStatus,
+    MarketplacePublication,
+    Media,
+    PublishedListing,
+)
+from services.events import notify_listing_changed
+
+logger = logging.getLogger(__name__)
+
+# Tables referencing listings.id, cleared before the listings themselves
+LISTING_CHILD_MODELS = (Media, PublishedListing, MarketplacePublication)
+
+# Called with the running count of processed listings, inside the chunk's transaction
+ProgressFn = Callable[[int], None]
+
+
+def iter_listing_chunks(
+    db: Session,
+    user_id: int,
+    criteria: Iterable = (),
+    listing_ids: Optional[list[int]] = None,
+    chunk_size: int = 500
+) -> Iterator[list[int]]:
+    """
+    Yield IDs of a user's listings matching criteria, one chunk at a time.
+    
+    With listing_ids only those listings are considered. Otherwise listings
+    are paged by ID, so rows deleted or updated by the caller between chunks
+    are never revisited.
+    """
+    criteria = [Listing.user_id == user_id, *criteria]
+    
+    if listing_ids is not None:
+        unique_ids = sorted(set(listing_ids))
+        for start in range(0, len(unique_ids), chunk_size):
+            ids = db.scalars(
+                select(Listing.id)
+                .where(Listing.id.in_(unique_ids[start:start + chunk_size]), *criteria)
+                .order_by(Listing.id)
+            ).all()
+            if ids:
+                yield list(ids)
+        return
+    
+    last_id = 0
+    while True:
+        ids = db.scalars(
+            select(Listing.id)
+            .where(Listing.id > last_id, *criteria)
+            .order_by(Listing.id)
+            .limit(chunk_size)
+        ).all()
+        if not ids:
+            return
+        yield list(ids)
+        last_id = ids[-1]
+
+
+def count_listings(
+    db: Session,
+    user_id: int,
+    criteria: Iterable = (),
+    listing_ids: Optional[list[int]] = None
+) -> int:
+    """Count a user's listings matching criteria (and listing_ids, if given)."""
+    if listing_ids is not None:
+        return sum(len(ids) for ids in iter_listing_chunks(db, user_id, criteria, listing_ids))
+    
+    return db.scalar(
+        select(func.count(Listing.id)).where(Listing.user_id == user_id, *criteria)
+    )
+
+
+def delete_listings(
+    db: Session,
+    user_id: int,
+    criteria: Iterable = (),
+    listing_ids: Optional[list[int]] = None,
+    chunk_size: int = 500,
+    on_progress: Optional[ProgressFn] = None
+) -> int:
+    """
+    Delete a user's matching listings with set-based statements.
+    
+    Each chunk deletes child rows, then the listings, and commits.
+    
+    Returns:
+        Number of listings deleted
+    """
+    deleted = 0
+    for ids in iter_listing_chunks(db, user_id, criteria, listing_ids, chunk_size):
+        for model in LISTING_CHILD_MODELS:
+            db.execute(
+                delete(model).where(model.listing_id.in_(ids)),
+                execution_options={"synchronize_session": False}
+            )
+        db.execute(
+            delete(Listing).where(Listing.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        
+        deleted += len(ids)
+        notify_listing_changed(db, user_id)
+        if on_progress:
+            on_progress(deleted)
+        db.commit()
+    
+    return deleted
+
+
+def update_listings(
+    db: Session,
+    user_id: int,
+    criteria: Iterable = (),
+    listing_ids: Optional[list[int]] = None,
+    values: Optional[dict] = None,
+    values_by_id: Optional[dict[int, dict]] = None,
+    chunk_size: int = 500,
+    on_progress: Optional[ProgressFn] = None,
+    published_ids: Optional[list[int]] = None
+) -> int:
+    """
+    Update a user's matching listings with set-based statements.
+    
+    Each chunk runs a single UPDATE, bumps the listings' version and commits.
+    
+    Args:
+        values: Column values or SQL expressions (such as Listing.price * 1.05)
+            applied to every listing
+        values_by_id: Column values per listing ID, applied with a CASE per column
+        published_ids: If given, IDs of updated PUBLISHED listings are appended to it
+    
+    Returns:
+        Number of listings updated
+    """
+    updated = 0
+    for ids in iter_listing_chunks(db, user_id, criteria, listing_ids, chunk_size):
+        chunk_values = dict(values or {})
+        if values_by_id is not None:
+            columns = {column for listing_id in ids for column in values_by_id[listing_id]}
+            for column in columns:
+                chunk_values[column] = case(
+                    {
+                        listing_id: values_by_id[listing_id][column]
+                        for listing_id in ids
+                        if column in values_by_id[listing_id]
+                    },
+                    value=Listing.id,
+                    else_=getattr(Listing, column)
+                )
+        
+        rows = db.execute(
+            update(Listing)
+            .where(Listing.id.in_(ids))
+            .values(**chunk_values, version=Listing.version + 1)
+            .returning(Listing.id, Listing.status),
+            execution_options={"synchronize_session": False}
+        ).all()
+        
+        if published_ids is not None:
+            published_ids.extend(
+                listing_id for listing_id, listing_status in rows
+                if listing_status == ListingStatus.PUBLISHED
+            )
+        
+        updated += len(rows)
+        notify_listing_changed(db, user_id)
+        if on_progress:
+            on_progress(updated)
+        db.commit()
+    
+    return updated
+
+
+def create_job(db: Session, user_id: int, kind: str, total: int) -> BulkJob:
+    """Record a new running bulk job."""
+    job = BulkJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind, total=total)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def run_job(
+    session_factory: sessionmaker,
+    job_id: str,
+    work: Callable[[Session, ProgressFn], int]
+) -> None:
+    """
+    Run a bulk job in its own session, recording progress and the outcome.
+    
+    work is called with the session and an on_progress callback, and returns
+    the number of listings processed. Progress updates double as the job's
+    heartbeat (see reap_stale_jobs).
+    """
+    db = session_factory()
+    running = [BulkJob.id == job_id, BulkJob.status == BulkJobStatus.RUNNING]
+    
+    def set_progress(processed: int) -> None:
+        db.execute(update(BulkJob).where(*running).values(processed=processed, updated_at=datetime.utcnow()))
+    
+    try:
+        try:
+            processed = work(db, on_progress=set_progress)
+        except Exception as e:
+            logger.exception("Bulk job %s failed", job_id)
+            db.rollback()
+            db.execute(
+                update(BulkJob)
+                .where(*running)
+                .values(status=BulkJobStatus.FAILED, error_message=str(e), finished_at=datetime.utcnow())
+            )
+            db.commit()
+            return
+        
+        db.execute(
+            update(BulkJob)
+            .where(*running)
+            .values(status=BulkJobStatus.COMPLETED, processed=processed, finished_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def reap_stale_jobs(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Mark running jobs without progress for bulk_job_stale_after_minutes as failed.
+    
+    Jobs run inside a worker process, so a job whose worker died (or was
+    restarted) mid-run would otherwise stay RUNNING forever.
+    
+    Returns:
+        Number of jobs marked failed
+    """
+    now = now or datetime.utcnow()
+    stale_after = timedelta(minutes=settings.bulk_job_stale_after_minutes)
+    
+    reaped = db.execute(
+        update(BulkJob)
+        .where(BulkJob.status == BulkJobStatus.RUNNING, BulkJob.updated_at < now - stale_after)
+        .values(
+            status=BulkJobStatus.FAILED,
+            error_message="Job stopped making progress; its worker may have restarted",
+            finished_at=now
+        )
+    ).rowcount
+    db.commit()
+    
+    if reaped:
+        logger.warning("Marked %d stale bulk jobs as failed", reaped)
+    return reaped
+
+
+def reap_all_stale_jobs() -> int:
+    """Reap stale bulk jobs on every shard with dedicated sessions."""
+    reaped = 0
+    for session_factory in shard_sessions:
+        db = session_factory()
+        try:
+            reaped += reap_stale_jobs(db)
+        finally:
+            db.close()
+    return reaped
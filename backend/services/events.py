@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import engines
+from core.metrics import metrics
+from models import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL NOTIFY channel carrying change events
+CHANNEL = "bnb_changes"
+
+# Session.info key of changes waiting for their transaction to commit
+PENDING_KEY = "pending_changes"
+
+
+class Change(NamedTuple):
+    """
+    A change to a user's listings ("listing") or to a user row ("user").
+    
+    listing_id is None when several of the user's listings changed. A
+    "reset" change (user_id 0) means changes may have been missed and every
+    cached entry should be dropped.
+    """
+    entity: str
+    user_id: int
+    listing_id: Optional[int] = None
+
+
+Subscriber = Callable[[Change], None]
+
+
+def uses_notify(engine: Engine) -> bool:
+    """Whether changes on a database travel over LISTEN/NOTIFY instead of the change log."""
+    return engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+
+
+class ChangeBus:
+    """
+    Deliver listing and user changes to every worker, to invalidate caches.
+    
+    Changes are published inside the writer's transaction, so they are only
+    delivered if it commits. On PostgreSQL with psycopg2 they are sent with
+    NOTIFY and each worker LISTENs on every shard; on SQLite they are written
+    to the change_events table, which each worker polls (settings refuse
+    other databases). The publishing
+    worker gets its own changes right after the commit rather than through
+    the database.
+    Subscribers may be called from any thread and must be quick.
+    """
+    
+    def __init__(self, poll_interval: float = 0.2, retention: timedelta = timedelta(minutes=10)):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._subscribers: list[Subscriber] = []
+        self._lock = threading.Lock()
+    
+    def subscribe(self, callback: Subscriber) -> None:
+        """Call callback with every change, local or from other workers."""
+        with self._lock:
+            self._subscribers.append(callback)
+    
+    def publish(self, db: Session, change: Change) -> None:
+        """Publish a change when the session's transaction commits, without committing."""
+        if not settings.events_enabled:
+            return
+        
+        payload = {"entity": change.entity, "user_id": change.user_id, "listing_id": change.listing_id}
+        if uses_notify(db.get_bind()):
+            db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": json.dumps({**payload, "origin": self.origin})}
+            )
+        else:
+            db.execute(insert(ChangeEvent).values(**payload, origin=self.origin))
+        
+        db.info.setdefault(PENDING_KEY, []).append(change)
+        metrics.increment("events.published")
+    
+    def dispatch(self, change: Change) -> None:
+        """Call every subscriber with a change."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        
+        for callback in subscribers:
+            try:
+                callback(change)
+            except Exception:
+                logger.exception("Change subscriber failed for %s", change)
+    
+    async def run(self) -> None:
+        """Receive changes made by other workers on every shard until cancelled."""
+        await asyncio.gather(*(
+            self._listen(shard_engine) if uses_notify(shard_engine) else self._poll(shard_engine)
+            for shard_engine in engines
+        ))
+    
+    def _receive(self, payload: dict) -> None:
+        """Dispatch a change from the database unless this worker made it."""
+        if payload["origin"] == self.origin:
+            return
+        
+        metrics.increment("events.received")
+        self.dispatch(Change(payload["entity"], payload["user_id"], payload["listing_id"]))
+    
+    async def _listen(self, engine: Engine) -> None:
+        """LISTEN for changes on a PostgreSQL shard, reconnecting on errors."""
+        connected_before = False
+        while True:
+            try:
+                raw = await asyncio.to_thread(self._connect_listener, engine)
+            except Exception:
+                logger.exception("Could not LISTEN for changes; retrying")
+                await asyncio.sleep(max(self.poll_interval, 1.0))
+                continue
+            
+            # Changes made while disconnected were lost
+            if connected_before:
+                self.dispatch(Change("reset", 0))
+            connected_before = True
+            
+            try:
+                await self._read_notifications(raw.driver_connection)
+            except Exception:
+                logger.exception("Lost the change notification connection; reconnecting")
+            finally:
+                raw.invalidate()
+    
+    @staticmethod
+    def _connect_listener(engine: Engine):
+        """Open a dedicated autocommit connection listening on the channel."""
+        raw = engine.raw_connection()
+        connection = raw.driver_connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return raw
+    
+    async def _read_notifications(self, connection) -> None:
+        """Dispatch notifications as the connection's socket becomes readable."""
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(connection.fileno(), readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                connection.poll()
+                while connection.notifies:
+                    self._receive(json.loads(connection.notifies.pop(0).payload))
+        finally:
+            loop.remove_reader(connection.fileno())
+    
+    async def _poll(self, engine: Engine) -> None:
+        """Poll a shard's change log, pruning old events as it goes."""
+        last_id = None
+        last_pruned = datetime.utcnow()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if last_id is None:
+                    last_id = await asyncio.to_thread(self._latest_id, engine)
+                    continue
+                
+                rows = await asyncio.to_thread(self._fetch_since, engine, last_id)
+                for row in rows:
+                    last_id = row["id"]
+                    self._receive(row)
+                
+                if datetime.utcnow() - last_pruned > self.retention / 2:
+                    await asyncio.to_thread(self._prune, engine)
+                    last_pruned = datetime.utcnow()
+            except Exception:
+                logger.exception("Polling change events failed")
+    
+    @staticmethod
+    def _latest_id(engine: Engine) -> int:
+        """ID of the newest change event (changes before it are already visible)."""
+        with engine.connect() as conn:
+            return conn.scalar(select(func.max(ChangeEvent.id))) or 0
+    
+    @staticmethod
+    def _fetch_since(engine: Engine, last_id: int) -> list[dict]:
+        """Change events after last_id, oldest first."""
+        with engine.connect() as conn:
+            return [
+                dict(row) for row in conn.execute(
+                    select(ChangeEvent.__table__).where(ChangeEvent.id > last_id).order_by(ChangeEvent.id)
+                ).mappings()
+            ]
+    
+    def _prune(self, engine: Engine) -> None:
+        """Delete change events older than the retention period."""
+        with engine.begin() as conn:
+            conn.execute(delete(ChangeEvent).where(ChangeEvent.created_at < datetime.utcnow() - self.retention))
+
+
+class GenerationTracker:
+    """
+    Per-user counters that move on every change to one entity, for cache keys.
+    
+    An entry cached under a user's generation is stale once it moves. Read
+    the generation before loading what is cached, so a change landing in
+    between leaves the entry under an already outdated key.
+    """
+    
+    def __init__(self, entity: str):
+        self.entity = entity
+        self._epoch = 0
+        self._generations: dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+    
+    def __call__(self, change: Change) -> None:
+        with self._lock:
+            if change.entity == "reset":
+                self._epoch += 1
+                self._generations.clear()
+            elif change.entity == self.entity:
+                self._generations[change.user_id] += 1
+    
+    def get(self, user_id: int) -> tuple[int, int]:
+        """Current generation of a user's entity."""
+        with self._lock:
+            return self._epoch, self._generations.get(user_id, 0)
+
+
+change_bus = ChangeBus(
+    poll_interval=settings.events_poll_interval_ms / 1000,
+    retention=timedelta(minutes=settings.events_retention_minutes)
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed(session: Session) -> None:
+    """Apply a session's committed changes to this worker's caches."""
+    for change in session.info.pop(PENDING_KEY, ()):
+        change_bus.dispatch(change)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_uncommitted(session: Session, transaction) -> None:
+    """Forget changes of a transaction that ended without committing."""
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+def notify_listing_changed(db: Session, user_id: int, listing_id: Optional[int] = None) -> None:
+    """Publish a change to one (or, without listing_id, several) of a user's listings."""
+    change_bus.publish(db, Change("listing", user_id, listing_id))
+
+
+def notify_user_changed(db: Session, user_id: int) -> None:
+    """Publish a change to a user row."""
+    change_bus.publish(db, Change("user", user_id))
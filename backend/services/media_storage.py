@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from PIL import Image
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+# Extension of each supported Pillow image format
+FORMAT_EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "WEBP": "webp",
+    "GIF": "gif",
+}
+MEDIA_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp|gif)$")
+
+
+class MediaUploadError(Exception):
+    """Raised when an uploaded file is rejected."""
+    
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class MediaStorage:
+    """Content-addressed local storage for uploaded media files."""
+    
+    def __init__(self, root: str, max_upload_bytes: int):
+        self.root = Path(root)
+        self.max_upload_bytes = max_upload_bytes
+    
+    def path_for(self, name: str) -> Optional[Path]:
+        """Resolve a stored media name to its file, or None if unknown."""
+        if not MEDIA_NAME_PATTERN.match(name):
+            return None
+        
+        path = self.root / name[:2] / name
+        return path if path.is_file() else None
+    
+    async def save_multipart(
+        self,
+        stream: AsyncIterator[bytes],
+        content_type: str,
+        field_name: str = "file"
+    ) -> str:
+        """
+        Stream a multipart upload to disk without buffering the whole file.
+        
+        The file part named field_name is written chunk by chunk to a temporary
+        file while it is hashed, then checked to be an image of a supported
+        format and moved to its content-addressed location. The stored
+        extension follows the file's content, not the declared part type.
+        Identical uploads are stored once.
+        
+        Args:
+            stream: Raw request body chunks
+            content_type: Request Content-Type header (with boundary)
+            field_name: Name of the form field holding the file
+        
+        Returns:
+            Stored media name ("<sha256>.<ext>")
+        
+        Raises:
+            MediaUploadError: If the body is malformed, too large or not an image
+        """
+        mime_type, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if mime_type != b"multipart/form-data" or not boundary:
+            raise MediaUploadError("Expected a multipart/form-data body")
+        
+        tmp_dir = self.root / "tmp"
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        
+        state = {
+            "header_field": b"",
+            "header_value": b"",
+            "headers": {},
+            "active": False,
+            "found": False,
+            "extension": None,
+        }
+        pending: list[bytes] = []
+        
+        def on_part_begin() -> None:
+            state["headers"] = {}
+        
+        def on_header_field(data: bytes, start: int, end: int) -> None:
+            state["header_field"] += data[start:end]
+        
+        def on_header_value(data: bytes, start: int, end: int) -> None:
+            state["header_value"] += data[start:end]
+        
+        def on_header_end() -> None:
+            state["headers"][state["header_field"].lower()] = state["header_value"]
+            state["header_field"] = b""
+            state["header_value"] = b""
+        
+        def on_headers_finished() -> None:
+            _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+            is_file_field = (
+                not state["found"]
+                and disposition.get(b"name", b"").decode("latin-1") == field_name
+                and b"filename" in disposition
+            )
+            state["active"] = is_file_field
+            if is_file_field:
+                state["found"] = True
+                part_type = state["headers"].get(b"content-type", b"").decode("latin-1").lower()
+                state["extension"] = IMAGE_EXTENSIONS.get(part_type)
+        
+        def on_part_data(data: bytes, start: int, end: int) -> None:
+            if state["active"]:
+                pending.append(data[start:end])
+        
+        def on_part_end() -> None:
+            state["active"] = False
+        
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+        
+        digest = hashlib.sha256()
+        size = 0
+        tmp = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+        try:
+            try:
+                async for chunk in stream:
+                    parser.write(chunk)
+                    
+                    if state["found"] and state["extension"] is None:
+                        raise MediaUploadError(
+                            "Unsupported image type",
+                            status_code=415
+                        )
+                    
+                    if pending:
+                        data = b"".join(pending)
+                        pending.clear()
+                        size += len(data)
+                        if size > self.max_upload_bytes:
+                            raise MediaUploadError("Upload is too large", status_code=413)
+                        digest.update(data)
+                        await asyncio.to_thread(tmp.write, data)
+                
+                parser.finalize()
+            except MultipartParseError:
+                raise MediaUploadError("Malformed multipart body")
+            finally:
+                await asyncio.to_thread(tmp.close)
+            
+            if not state["found"]:
+                raise MediaUploadError(f"Missing file field '{field_name}'")
+            if size == 0:
+                raise MediaUploadError("Uploaded file is empty")
+            
+            extension = await asyncio.to_thread(self._image_extension, Path(tmp.name))
+            name = f"{digest.hexdigest()}.{extension}"
+            await asyncio.to_thread(self._commit, Path(tmp.name), name)
+            return name
+        except Exception:
+            await asyncio.to_thread(Path(tmp.name).unlink, missing_ok=True)
+            raise
+    
+    @staticmethod
+    def _image_extension(path: Path) -> str:
+        """Extension of an uploaded image, from its contents."""
+        try:
+            with Image.open(path) as image:
+                image_format = image.format
+                image.verify()
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+            raise MediaUploadError("Uploaded file is not a valid image", status_code=415)
+        
+        extension = FORMAT_EXTENSIONS.get(image_format)
+        if extension is None:
+            raise MediaUploadError("Unsupported image type", status_code=415)
+        return extension
+    
+    def _commit(self, tmp_path: Path, name: str) -> None:
+        """Move a finished upload into place, keeping an existing identical file."""
+        target_dir = self.root / name[:2]
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / name
+        
+        if target.exists():
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, target)
@@ -1,7 +1,11 @@
+import asyncio
+import time
+import uuid
 import httpx
 from typing import Optional, List
 
 from core.config import settings
+from core.metrics import metrics
 
 
 class N8nClient:
@@ -10,7 +14,14 @@ class N8nClient:
     def __init__(self):
         self.media_webhook_url = settings.n8n_media_generation_webhook
         self.ebay_webhook_url = settings.n8n_ebay_publish_webhook
+        self.marketplace_webhook_urls = settings.marketplace_webhooks_map
         self.backend_url = settings.backend_url
+        self.ebay_batch_size = settings.ebay_publish_batch_size
+        self.ebay_batch_window = settings.ebay_publish_batch_window_seconds
+        
+        # Pending batch of (item payload, future) pairs awaiting flush
+        self._ebay_batch: List[tuple[dict, asyncio.Future]] = []
+        self._ebay_batch_timer: Optional[asyncio.TimerHandle] = None
     
     async def trigger_media_generation(
         self,
@@ -19,7 +30,8 @@ class N8nClient:
         product_photo_url: str,
         target_audience: str,
         product_features: str,
-        video_setting: str
+        video_setting: str,
+        trace_id: Optional[str] = None
     ) -> dict:
         """
         Trigger n8n UGC media generation workflow.
@@ -31,7 +43,8 @@ class N8nClient:
             target_audience: Target ICP (ideal customer profile)
             product_features: Key features of the product
             video_setting: Setting/scene description for video
-            
+            trace_id: Pipeline trace ID, echoed back on the callback
+        
         Returns:
             Response from n8n webhook
         """
@@ -42,15 +55,18 @@ class N8nClient:
             "ICP": target_audience,
             "Product Features": product_features,
             "Video Setting": video_setting,
+            "trace_id": trace_id,
             "callback_url": f"{self.backend_url}/webhooks/media-complete"
         }
         
+        started = time.perf_counter()
         async with httpx.AsyncClient() as client:
             response = await client.post(
                 self.media_webhook_url,
                 json=payload,
                 timeout=60.0
             )
+            metrics.observe("n8n.media_generation.trigger_seconds", time.perf_counter() - started)
             response.raise_for_status()
             return response.json()
     
@@ -64,7 +80,8 @@ class N8nClient:
         price: float,
         quantity: int,
         image_urls: List[str],
-        ebay_token: Optional[str] = None
+        ebay_token: Optional[str] = None,
+        trace_id: Optional[str] = None
     ) -> dict:
         """
         Trigger n8n eBay publishing workflow.
@@ -79,28 +96,274 @@ class N8nClient:
             quantity: Product quantity
             image_urls: List of image URLs
             ebay_token: eBay access token (optional for sandbox)
-            
+            trace_id: Pipeline trace ID, echoed back on the callback
+        
+        Returns:
+            Response from n8n webhook
+        """
+        payload = self._ebay_item_payload(
+            listing_id=listing_id,
+            title=title,
+            description=description,
+            category_id=category_id,
+            condition_id=condition_id,
+            price=price,
+            quantity=quantity,
+            image_urls=image_urls,
+            ebay_token=ebay_token,
+            trace_id=trace_id
+        )
+        payload["callback_url"] = f"{self.backend_url}/webhooks/ebay-complete"
+        
+        started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                self.ebay_webhook_url,
+                json=payload,
+                timeout=30.0
+            )
+            metrics.observe("n8n.ebay_publish.trigger_seconds", time.perf_counter() - started)
+            response.raise_for_status()
+            return response.json()
+    
+    async def publish_ebay(
+        self,
+        listing_id: int,
+        title: str,
+        description: str,
+        category_id: Optional[str],
+        condition_id: Optional[str],
+        price: float,
+        quantity: int,
+        image_urls: List[str],
+        ebay_token: Optional[str] = None,
+        trace_id: Optional[str] = None
+    ) -> dict:
+        """
+        Publish a listing to eBay, batching with other listings when enabled.
+        
+        With batching enabled the item is queued and sent together with other
+        APPROVED listings once the batch is full or the batch window expires.
+        The call resolves when its batch has been accepted by n8n. Each item's
+        correlation_id is the publish's trace ID, which is stored on the
+        listing's eBay publication and checked when the result comes back.
+        
+        Returns:
+            Response from n8n webhook
+        """
+        if self.ebay_batch_size <= 1:
+            return await self.trigger_ebay_publish(
+                listing_id=listing_id,
+                title=title,
+                description=description,
+                category_id=category_id,
+                condition_id=condition_id,
+                price=price,
+                quantity=quantity,
+                image_urls=image_urls,
+                ebay_token=ebay_token,
+                trace_id=trace_id
+            )
+        
+        item = self._ebay_item_payload(
+            listing_id=listing_id,
+            title=title,
+            description=description,
+            category_id=category_id,
+            condition_id=condition_id,
+            price=price,
+            quantity=quantity,
+            image_urls=image_urls,
+            ebay_token=ebay_token,
+            trace_id=trace_id
+        )
+        item["correlation_id"] = trace_id
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ebay_batch.append((item, future))
+        
+        if len(self._ebay_batch) >= self.ebay_batch_size:
+            self._flush_ebay_batch()
+        elif self._ebay_batch_timer is None:
+            self._ebay_batch_timer = loop.call_later(
+                self.ebay_batch_window,
+                self._flush_ebay_batch
+            )
+        
+        return await future
+    
+    async def trigger_ebay_publish_batch(self, items: List[dict]) -> dict:
+        """
+        Trigger n8n eBay publishing workflow for a batch of listings.
+        
+        Args:
+            items: Item payloads, each carrying its listing_id and correlation_id
+        
+        Returns:
+            Response from n8n webhook
+        """
+        payload = {
+            "batch_id": uuid.uuid4().hex,
+            "items": items,
+            "callback_url": f"{self.backend_url}/webhooks/ebay-complete"
+        }
+        
+        started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                self.ebay_webhook_url,
+                json=payload,
+                timeout=30.0
+            )
+            metrics.observe("n8n.ebay_publish.trigger_seconds", time.perf_counter() - started)
+            response.raise_for_status()
+            return response.json()
+    
+    def _flush_ebay_batch(self) -> None:
+        """Send the pending eBay batch in the background."""
+        if self._ebay_batch_timer is not None:
+            self._ebay_batch_timer.cancel()
+            self._ebay_batch_timer = None
+        
+        batch, self._ebay_batch = self._ebay_batch, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._send_ebay_batch(batch))
+    
+    async def _send_ebay_batch(self, batch: List[tuple[dict, asyncio.Future]]) -> None:
+        """Post a batch and resolve the futures of every item in it."""
+        try:
+            result = await self.trigger_ebay_publish_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for _, future in batch:
+            if not future.done():
+                future.set_result(result)
+    
+    async def trigger_marketplace_publish(
+        self,
+        marketplace: str,
+        listing_id: int,
+        title: str,
+        description: str,
+        category_id: Optional[str],
+        condition_id: Optional[str],
+        price: float,
+        quantity: int,
+        image_urls: List[str],
+        trace_id: Optional[str] = None
+    ) -> dict:
+        """
+        Trigger the n8n publishing workflow of a non-eBay marketplace.
+        
+        Args:
+            marketplace: Marketplace target name from settings
+            listing_id: ID of the listing
+            title: Product title
+            description: Product description
+            category_id: Marketplace category ID
+            condition_id: Marketplace condition ID
+            price: Product price
+            quantity: Product quantity
+            image_urls: List of image URLs
+            trace_id: Pipeline trace ID, echoed back on the callback
+        
         Returns:
             Response from n8n webhook
         """
         payload = {
             "listing_id": listing_id,
+            "marketplace": marketplace,
             "title": title,
             "description": description,
-            "category_id": category_id or "default",
-            "condition_id": condition_id or "1000",  # New
+            "category_id": category_id,
+            "condition_id": condition_id,
             "price": price,
             "quantity": quantity,
             "image_urls": image_urls,
-            "ebay_token": ebay_token,
-            "callback_url": f"{self.backend_url}/webhooks/ebay-complete"
+            "trace_id": trace_id,
+            "callback_url": f"{self.backend_url}/webhooks/publish-complete"
         }
         
+        started = time.perf_counter()
         async with httpx.AsyncClient() as client:
             response = await client.post(
-                self.ebay_webhook_url,
+                self.marketplace_webhook_urls[marketplace],
                 json=payload,
                 timeout=30.0
             )
+            metrics.observe(f"n8n.{marketplace}_publish.trigger_seconds", time.perf_counter() - started)
             response.raise_for_status()
             return response.json()
+    
+    async def trigger_marketplace_revise(
+        self,
+        marketplace: str,
+        items: List[dict],
+        ebay_token: Optional[str] = None
+    ) -> dict:
+        """
+        Trigger a batched revise of listings already live on a marketplace.
+        
+        The marketplace's publish workflow receives the batch with
+        action "revise".
+        
+        Args:
+            marketplace: Marketplace target name from settings
+            items: Revised listing payloads, each with its external_item_id
+            ebay_token: eBay access token (optional for sandbox), only sent
+                to the eBay workflow
+        
+        Returns:
+            Response from n8n webhook
+        """
+        payload = {
+            "action": "revise",
+            "batch_id": uuid.uuid4().hex,
+            "marketplace": marketplace,
+            "items": items
+        }
+        if marketplace == "ebay":
+            payload["ebay_token"] = ebay_token
+        
+        started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                self.marketplace_webhook_urls[marketplace],
+                json=payload,
+                timeout=30.0
+            )
+            metrics.observe(f"n8n.{marketplace}_revise.trigger_seconds", time.perf_counter() - started)
+            response.raise_for_status()
+            return response.json()
+    
+    @staticmethod
+    def _ebay_item_payload(
+        listing_id: int,
+        title: str,
+        description: str,
+        category_id: Optional[str],
+        condition_id: Optional[str],
+        price: float,
+        quantity: int,
+        image_urls: List[str],
+        ebay_token: Optional[str] = None,
+        trace_id: Optional[str] = None
+    ) -> dict:
+        """Build the per-listing part of an eBay publish payload."""
+        return {
+            "listing_id": listing_id,
+            "title": title,
+            "description": description,
+            "category_id": category_id or "default",
+            "condition_id": condition_id or "1000",  # New
+            "price": price,
+            "quantity": quantity,
+            "image_urls": image_urls,
+            "ebay_token": ebay_token,
+            "trace_id": trace_id
+        }
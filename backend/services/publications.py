@@ -0,0 +1,298 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+from datetime import datetime
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import metrics
+from core.database import shard_for_listing, shard_sessions
+from models import Listing, ListingStatus, MarketplacePublication, PublicationStatus, PublishedListing
+from services.events import notify_listing_changed
+from services.n8n_client import N8nClient
+from services.transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+
+def start_publications(
+    db: Session,
+    listing: Listing,
+    marketplaces: Iterable[str],
+    trace_id: Optional[str] = None
+) -> None:
+    """Mark each marketplace target of a listing as publishing, without committing."""
+    existing = {publication.marketplace: publication for publication in listing.publications}
+    
+    for marketplace in marketplaces:
+        publication = existing.get(marketplace)
+        if publication is None:
+            publication = MarketplacePublication(listing_id=listing.id, marketplace=marketplace)
+            db.add(publication)
+            existing[marketplace] = publication
+        
+        publication.status = PublicationStatus.PUBLISHING
+        publication.error_message = None
+        publication.trace_id = trace_id
+
+
+def finish_publication(
+    db: Session,
+    listing_id: int,
+    marketplace: str,
+    success: bool,
+    external_item_id: Optional[str] = None,
+    external_url: Optional[str] = None,
+    fees: Optional[dict] = None,
+    error_message: Optional[str] = None,
+    trace_id: Optional[str] = None,
+    correlation_id: Optional[str] = None
+) -> Optional[Listing]:
+    """
+    Record the result of publishing a listing to one marketplace, without committing.
+    
+    Once every target of the current publish (the publication rows sharing
+    this row's trace ID) has reported, the listing moves from PUBLISHING to
+    PUBLISHED if at least one target succeeded, otherwise to ERROR. Results
+    left by earlier publishes to other marketplaces are not counted.
+    
+    Listings that started publishing to eBay before per-marketplace tracking
+    have no publication rows; their eBay result finishes them directly.
+    
+    Args:
+        correlation_id: If given, the trace ID the publication must have been
+            started with, so a result only applies to the publish it answers
+    
+    Returns:
+        The listing, or None if the marketplace was not publishing it (under
+        correlation_id, when given)
+    """
+    values = {
+        "status": PublicationStatus.PUBLISHED if success else PublicationStatus.ERROR,
+        "error_message": None if success else (error_message or f"{marketplace} publishing failed"),
+    }
+    if success:
+        values.update(
+            external_item_id=external_item_id,
+            external_url=external_url,
+            fees=fees,
+            published_at=datetime.utcnow()
+        )
+    
+    conditions = [
+        MarketplacePublication.listing_id == listing_id,
+        MarketplacePublication.marketplace == marketplace,
+        MarketplacePublication.status == PublicationStatus.PUBLISHING
+    ]
+    if correlation_id is not None:
+        conditions.append(MarketplacePublication.trace_id == correlation_id)
+    
+    updated = db.execute(
+        update(MarketplacePublication)
+        .where(*conditions)
+        .values(**values)
+        .returning(MarketplacePublication.trace_id)
+    ).first()
+    if updated is None:
+        if marketplace == "ebay" and correlation_id is None:
+            return _finish_untracked_publication(db, listing_id, values, trace_id=trace_id)
+        return None
+    
+    # Rows of the current publish share the trace ID it was started with
+    current = [
+        MarketplacePublication.listing_id == listing_id,
+        MarketplacePublication.trace_id == updated.trace_id
+    ]
+    
+    # Lock the listing row so concurrent results for it are counted in turn
+    listing = db.execute(
+        update(Listing)
+        .where(Listing.id == listing_id)
+        .values(version=Listing.version + 1)
+        .returning(Listing)
+    ).scalar_one()
+    notify_listing_changed(db, listing.user_id, listing_id)
+    
+    counts = dict(
+        db.query(MarketplacePublication.status, func.count())
+        .filter(*current)
+        .group_by(MarketplacePublication.status)
+        .all()
+    )
+    if counts.get(PublicationStatus.PUBLISHING):
+        return listing
+    
+    if counts.get(PublicationStatus.PUBLISHED):
+        apply_transition(
+            db,
+            listing_id,
+            ListingStatus.PUBLISHING,
+            ListingStatus.PUBLISHED,
+            trace_id=trace_id,
+            error_message=None
+        )
+    else:
+        errors = db.query(MarketplacePublication.marketplace, MarketplacePublication.error_message).filter(
+            *current
+        ).all()
+        apply_transition(
+            db,
+            listing_id,
+            ListingStatus.PUBLISHING,
+            ListingStatus.ERROR,
+            trace_id=trace_id,
+            error_message="; ".join(f"{name}: {message}" for name, message in errors)
+        )
+    
+    return listing
+
+
+def _finish_untracked_publication(
+    db: Session,
+    listing_id: int,
+    values: dict,
+    trace_id: Optional[str] = None
+) -> Optional[Listing]:
+    """
+    Finish an eBay publish started before per-marketplace tracking, without committing.
+    
+    Applies only while the listing is PUBLISHING without any publication
+    rows. The result is recorded as the listing's eBay publication.
+    
+    Returns:
+        The listing, or None if it is not such a listing
+    """
+    tracked = db.query(MarketplacePublication.id).filter(
+        MarketplacePublication.listing_id == listing_id
+    ).first()
+    if tracked is not None:
+        return None
+    
+    succeeded = values["status"] == PublicationStatus.PUBLISHED
+    listing = apply_transition(
+        db,
+        listing_id,
+        ListingStatus.PUBLISHING,
+        ListingStatus.PUBLISHED if succeeded else ListingStatus.ERROR,
+        trace_id=trace_id,
+        error_message=None if succeeded else f"ebay: {values['error_message']}"
+    )
+    if listing is not None:
+        db.add(MarketplacePublication(listing_id=listing_id, marketplace="ebay", trace_id=trace_id, **values))
+    
+    return listing
+
+
+async def trigger_publication(
+    n8n_client: N8nClient,
+    marketplace: str,
+    item: dict,
+    ebay_token: Optional[str] = None
+) -> None:
+    """Trigger one marketplace workflow, recording a failure if it cannot be started."""
+    try:
+        if marketplace == "ebay":
+            trigger = n8n_client.publish_ebay(**item, ebay_token=ebay_token)
+        else:
+            trigger = n8n_client.trigger_marketplace_publish(marketplace, **item)
+        await asyncio.wait_for(trigger, timeout=settings.marketplace_publish_timeout_seconds)
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            error_message = f"Timed out triggering {marketplace} publishing"
+        else:
+            error_message = f"Failed to trigger {marketplace} publishing: {str(e)}"
+        await asyncio.to_thread(
+            record_publish_failure,
+            item["listing_id"],
+            marketplace,
+            error_message,
+            item["trace_id"]
+        )
+
+
+def record_publish_failure(
+    listing_id: int,
+    marketplace: str,
+    error_message: str,
+    trace_id: Optional[str] = None
+) -> None:
+    """Mark one marketplace target as failed in its own session."""
+    db = shard_sessions[shard_for_listing(listing_id)]()
+    try:
+        finish_publication(
+            db,
+            listing_id,
+            marketplace,
+            success=False,
+            error_message=error_message,
+            trace_id=trace_id
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def collect_revisions(db: Session, listing_ids: list[int]) -> dict[str, list[dict]]:
+    """
+    Build revise payloads for listings live on marketplaces.
+    
+    Returns:
+        Revise items per marketplace
+    """
+    revisions = defaultdict(dict)
+    for start in range(0, len(listing_ids), settings.bulk_chunk_size):
+        chunk = listing_ids[start:start + settings.bulk_chunk_size]
+        
+        # eBay listings published before per-marketplace tracking
+        legacy = db.query(PublishedListing.ebay_item_id, Listing).join(Listing).filter(
+            Listing.id.in_(chunk)
+        )
+        live = db.query(MarketplacePublication.marketplace, MarketplacePublication.external_item_id, Listing).join(
+            Listing
+        ).filter(
+            Listing.id.in_(chunk),
+            MarketplacePublication.status == PublicationStatus.PUBLISHED
+        )
+        
+        rows = [("ebay", item_id, listing) for item_id, listing in legacy] + live.all()
+        for marketplace, external_item_id, listing in rows:
+            revisions[marketplace][listing.id] = {
+                "listing_id": listing.id,
+                "external_item_id": external_item_id,
+                "title": listing.title,
+                "description": listing.enriched_description or listing.description,
+                "category_id": listing.category_id,
+                "condition_id": listing.condition_id,
+                "price": listing.price,
+                "quantity": listing.quantity
+            }
+    
+    return {marketplace: list(items.values()) for marketplace, items in revisions.items()}
+
+
+async def trigger_revisions(
+    n8n_client: N8nClient,
+    revisions: dict[str, list[dict]],
+    ebay_token: Optional[str] = None
+) -> None:
+    """Send one revise batch per marketplace, logging failures."""
+    targets = settings.marketplace_webhooks_map
+    
+    async def revise(marketplace: str, items: list[dict]) -> None:
+        if marketplace not in targets:
+            logger.warning("Cannot revise %d listings on unconfigured marketplace %s", len(items), marketplace)
+            return
+        try:
+            await n8n_client.trigger_marketplace_revise(
+                marketplace,
+                items,
+                ebay_token=ebay_token if marketplace == "ebay" else None
+            )
+            metrics.increment(f"bulk.revise.{marketplace}.items", len(items))
+        except Exception:
+            logger.exception("Failed to trigger %s revise for %d listings", marketplace, len(items))
+            metrics.increment(f"bulk.revise.{marketplace}.failures")
+    
+    await asyncio.gather(*(revise(marketplace, items) for marketplace, items in revisions.items()))
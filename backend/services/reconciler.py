@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session, selectinload
+
+from core.config import settings
+from core.database import SessionLocal, shard_sessions
+from core.metrics import metrics
+from models import Listing, ListingStatus, MarketplacePublication, PublicationStatus, User
+from services.events import notify_listing_changed
+from services.n8n_client import N8nClient
+from services.publications import trigger_publication
+from services.transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+# Statuses that wait on an n8n callback
+WAITING_STATUSES = [ListingStatus.GENERATING_MEDIA, ListingStatus.PUBLISHING]
+
+
+def claim_stuck_listings(
+    db: Session,
+    now: Optional[datetime] = None,
+    max_retriggers: Optional[int] = None
+) -> dict:
+    """
+    Find listings stuck waiting for an n8n callback and decide what to do with them.
+    
+    Listings that have used up their re-triggers are moved to ERROR. Others are
+    claimed for a re-trigger, with exponential backoff between attempts and at
+    most max_retriggers (default reconciler_max_retriggers_per_sweep) claims
+    per call.
+    
+    Returns:
+        Counts plus the claimed work items ("retrigger")
+    """
+    now = now or datetime.utcnow()
+    if max_retriggers is None:
+        max_retriggers = settings.reconciler_max_retriggers_per_sweep
+    stuck_after = timedelta(minutes=settings.reconciler_stuck_after_minutes)
+    
+    listings = (
+        db.query(Listing)
+        .options(selectinload(Listing.media))
+        .filter(
+            Listing.status.in_(WAITING_STATUSES),
+            Listing.updated_at < now - stuck_after
+        )
+        .order_by(Listing.updated_at)
+        .limit(settings.reconciler_batch_size)
+        .all()
+    )
+    
+    result = {"stuck": len(listings), "failed": 0, "backing_off": 0, "retrigger": []}
+    for listing in listings:
+        # Each re-trigger doubles the wait before the next one
+        if listing.updated_at > now - stuck_after * (2 ** listing.reconcile_attempts):
+            result["backing_off"] += 1
+            continue
+        
+        if listing.reconcile_attempts >= settings.reconciler_max_attempts:
+            _fail_listing(db, listing)
+            result["failed"] += 1
+            continue
+        
+        if len(result["retrigger"]) >= max_retriggers:
+            continue
+        
+        item = _claim_retrigger(db, listing)
+        if item is not None:
+            result["retrigger"].append(item)
+    
+    db.commit()
+    return result
+
+
+def _fail_listing(db: Session, listing: Listing) -> None:
+    """Move a listing that never got its callback to ERROR, without committing."""
+    stage = listing.status.value.replace("_", " ")
+    from_status = listing.status
+    reason = (
+        f"No n8n callback received while {stage} "
+        f"after {listing.reconcile_attempts} re-triggers"
+    )
+    
+    failed = apply_transition(
+        db,
+        listing.id,
+        from_status,
+        ListingStatus.ERROR,
+        criteria=[Listing.version == listing.version],
+        error_message=reason
+    )
+    
+    if failed is not None:
+        db.execute(
+            update(MarketplacePublication)
+            .where(
+                MarketplacePublication.listing_id == listing.id,
+                MarketplacePublication.status == PublicationStatus.PUBLISHING
+            )
+            .values(status=PublicationStatus.ERROR, error_message=reason)
+        )
+
+
+def _claim_retrigger(db: Session, listing: Listing) -> Optional[dict]:
+    """
+    Claim a listing for a re-trigger, without committing.
+    
+    The claim only succeeds if the listing has not changed since it was read,
+    so a callback arriving mid-sweep wins.
+    """
+    claimed = db.execute(
+        update(Listing)
+        .where(Listing.id == listing.id, Listing.version == listing.version)
+        .values(version=Listing.version + 1, reconcile_attempts=Listing.reconcile_attempts + 1)
+        .returning(Listing.id)
+    ).first()
+    if claimed is None:
+        return None
+    notify_listing_changed(db, listing.user_id, listing.id)
+    
+    trace_id = uuid.uuid4().hex
+    if listing.status == ListingStatus.GENERATING_MEDIA:
+        return {
+            "status": listing.status,
+            "media": {
+                "listing_id": listing.id,
+                "product_name": listing.title,
+                "product_photo_url": listing.product_photo_url,
+                "target_audience": listing.target_audience or "General audience",
+                "product_features": listing.product_features or listing.description,
+                "video_setting": listing.video_setting or "Casual indoor setting",
+                "trace_id": trace_id
+            }
+        }
+    
+    pending = db.query(MarketplacePublication).filter(
+        MarketplacePublication.listing_id == listing.id,
+        MarketplacePublication.status == PublicationStatus.PUBLISHING
+    ).all()
+    # Keep the publish's trace ID, which results are correlated with
+    if pending and pending[0].trace_id:
+        trace_id = pending[0].trace_id
+    return {
+        "status": listing.status,
+        "marketplaces": [publication.marketplace for publication in pending],
+        "user_id": listing.user_id,
+        "item": {
+            "listing_id": listing.id,
+            "title": listing.title,
+            "description": listing.enriched_description or listing.description,
+            "category_id": listing.category_id,
+            "condition_id": listing.condition_id,
+            "price": listing.price,
+            "quantity": listing.quantity,
+            "image_urls": (listing.media.image_urls or []) if listing.media else [],
+            "trace_id": trace_id
+        }
+    }
+
+
+async def sweep(n8n_client: N8nClient) -> dict:
+    """Run one reconciliation sweep and re-trigger claimed workflows."""
+    started = time.perf_counter()
+    result = await asyncio.to_thread(_claim_in_session)
+    
+    triggers = []
+    for item in result["retrigger"]:
+        if item["status"] == ListingStatus.GENERATING_MEDIA:
+            triggers.append(_retrigger_media(n8n_client, item["media"]))
+        else:
+            triggers.extend(
+                trigger_publication(n8n_client, marketplace, item["item"], item["ebay_token"])
+                for marketplace in item["marketplaces"]
+            )
+    await asyncio.gather(*triggers)
+    
+    duration = time.perf_counter() - started
+    metrics.observe("reconciler.sweep_seconds", duration)
+    metrics.increment("reconciler.stuck_found", result["stuck"])
+    metrics.increment("reconciler.retriggered", len(result["retrigger"]))
+    metrics.increment("reconciler.failed", result["failed"])
+    metrics.increment("reconciler.backing_off", result["backing_off"])
+    
+    return {
+        "stuck": result["stuck"],
+        "retriggered": len(result["retrigger"]),
+        "failed": result["failed"],
+        "backing_off": result["backing_off"],
+        "seconds": duration
+    }
+
+
+async def _retrigger_media(n8n_client: N8nClient, media: dict) -> None:
+    """Re-trigger media generation; a failure is retried on a later sweep."""
+    try:
+        await n8n_client.trigger_media_generation(**media)
+    except Exception:
+        logger.warning("Failed to re-trigger media generation for listing %s", media["listing_id"])
+
+
+def _claim_in_session() -> dict:
+    """Claim stuck listings on every shard with dedicated sessions."""
+    result = {"stuck": 0, "failed": 0, "backing_off": 0, "retrigger": []}
+    for session_factory in shard_sessions:
+        remaining = settings.reconciler_max_retriggers_per_sweep - len(result["retrigger"])
+        db = session_factory()
+        try:
+            shard_result = claim_stuck_listings(db, max_retriggers=remaining)
+        finally:
+            db.close()
+        
+        for key in ("stuck", "failed", "backing_off", "retrigger"):
+            result[key] += shard_result[key]
+    
+    _add_ebay_tokens(result["retrigger"])
+    return result
+
+
+def _add_ebay_tokens(items: list[dict]) -> None:
+    """
+    Add each publish item's eBay token from the users directory.
+    
+    Shard copies of user rows are not kept up to date, so the token is read
+    from the primary database.
+    """
+    user_ids = {item["user_id"] for item in items if "user_id" in item}
+    if not user_ids:
+        return
+    
+    db = SessionLocal()
+    try:
+        tokens = dict(db.query(User.id, User.ebay_access_token).filter(User.id.in_(user_ids)).all())
+    finally:
+        db.close()
+    
+    for item in items:
+        if "user_id" in item:
+            item["ebay_token"] = tokens.get(item["user_id"])
+
+
+async def run_reconciler(n8n_client: N8nClient) -> None:
+    """Periodically reconcile listings stuck waiting for n8n callbacks."""
+    while True:
+        try:
+            result = await sweep(n8n_client)
+            if result["stuck"]:
+                logger.info("Reconciler sweep: %s", result)
+        except Exception:
+            logger.exception("Reconciler sweep failed")
+        
+        await asyncio.sleep(settings.reconciler_interval_seconds)
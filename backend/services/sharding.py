@@ -0,0 +1,268 @@
+import argparse
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session, selectinload
+
+from core.config import settings
+from core.database import SessionLocal, init_shards, shard_sessions
+from models import (
+    User,
+    Listing,
+    Media,
+    PublishedListing,
+    MarketplacePublication,
+    ListingStatus,
+    ArchivedListing,
+    ListingStatusHistory,
+    BulkJob,
+    BulkJobStatus,
+)
+from services.archive import archive_record, listing_from_archive
+from services.events import notify_listing_changed, notify_user_changed
+
+logger = logging.getLogger(__name__)
+
+# Listings in these statuses still expect an n8n callback, which is routed by
+# the listing ID the workflow was started with
+IN_FLIGHT_STATUSES = [ListingStatus.GENERATING_MEDIA, ListingStatus.PUBLISHING]
+
+
+class RebalanceError(Exception):
+    """Raised when a user's rows cannot be moved."""
+
+
+def _columns(obj, exclude: tuple[str, ...] = ()) -> dict:
+    """Column values of a model instance."""
+    return {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns
+        if column.key not in exclude
+    }
+
+
+def sync_user_to_shard(db: Session, user: User) -> None:
+    """
+    Copy a user's row to their home shard, without committing.
+    
+    Shards keep a copy of each resident user so listings can reference it.
+    """
+    db.merge(User(**_columns(user)))
+
+
+def _fingerprint(db: Session, user_id: int) -> tuple:
+    """Summary that changes whenever a user's listings or history change."""
+    listings = db.query(func.count(Listing.id), func.max(Listing.updated_at), func.sum(Listing.version)).filter(
+        Listing.user_id == user_id
+    ).one()
+    history = db.query(func.count(ListingStatusHistory.id)).filter(
+        ListingStatusHistory.user_id == user_id
+    ).scalar()
+    archived = db.query(func.count(ArchivedListing.id)).filter(
+        ArchivedListing.user_id == user_id
+    ).scalar()
+    return (*listings, history, archived)
+
+
+def _delete_user_rows(db: Session, user_id: int, keep_user: bool) -> None:
+    """Delete a user's listings, archive, history and jobs from a shard, without committing."""
+    listing_ids = select(Listing.id).where(Listing.user_id == user_id).scalar_subquery()
+    for model in (Media, PublishedListing, MarketplacePublication):
+        db.execute(delete(model).where(model.listing_id.in_(listing_ids)))
+    
+    db.execute(delete(Listing).where(Listing.user_id == user_id))
+    db.execute(delete(ArchivedListing).where(ArchivedListing.user_id == user_id))
+    db.execute(delete(ListingStatusHistory).where(ListingStatusHistory.user_id == user_id))
+    db.execute(delete(BulkJob).where(BulkJob.user_id == user_id))
+    if not keep_user:
+        db.execute(delete(User).where(User.id == user_id))
+
+
+def _copy_listing(listing: Listing) -> Listing:
+    """Copy a listing with its media and publications, leaving IDs to the target shard."""
+    copy = Listing(**_columns(listing, exclude=("id",)))
+    if listing.media:
+        copy.media = Media(**_columns(listing.media, exclude=("id", "listing_id")))
+    if listing.published_listing:
+        copy.published_listing = PublishedListing(
+            **_columns(listing.published_listing, exclude=("id", "listing_id"))
+        )
+    copy.publications = [
+        MarketplacePublication(**_columns(publication, exclude=("id", "listing_id")))
+        for publication in listing.publications
+    ]
+    return copy
+
+
+def _copy_user_rows(source_db: Session, target_db: Session, user: User) -> dict[int, int]:
+    """
+    Copy a user's rows from one shard to another, without committing.
+    
+    Listings, including archived ones, get new IDs from the target shard's
+    range so that their IDs keep routing to the shard holding them.
+    
+    Returns:
+        New listing ID for each old one
+    """
+    listings = (
+        source_db.query(Listing)
+        .options(
+            selectinload(Listing.media),
+            selectinload(Listing.published_listing),
+            selectinload(Listing.publications)
+        )
+        .filter(Listing.user_id == user.id)
+        .all()
+    )
+    in_flight = [listing.id for listing in listings if listing.status in IN_FLIGHT_STATUSES]
+    if in_flight:
+        raise RebalanceError(
+            f"Listings {in_flight} are waiting on n8n callbacks; retry once they finish"
+        )
+    
+    running_jobs = source_db.query(func.count(BulkJob.id)).filter(
+        BulkJob.user_id == user.id, BulkJob.status == BulkJobStatus.RUNNING
+    ).scalar()
+    if running_jobs:
+        raise RebalanceError(f"{running_jobs} bulk jobs are running; retry once they finish")
+    
+    sync_user_to_shard(target_db, user)
+    
+    copies = {listing.id: _copy_listing(listing) for listing in listings}
+    target_db.add_all(copies.values())
+    
+    # Archived listings take a listing ID on the target (never reused once
+    # deleted), then go back into the archive under it
+    archived_copies = {}
+    for archived in source_db.query(ArchivedListing).filter(ArchivedListing.user_id == user.id):
+        copy = _copy_listing(listing_from_archive(archived))
+        target_db.add(copy)
+        archived_copies[archived.id] = (copy, archived.archived_at)
+    target_db.flush()
+    
+    for copy, archived_at in archived_copies.values():
+        record = archive_record(copy)
+        record.archived_at = archived_at
+        target_db.add(record)
+        target_db.delete(copy)
+    
+    id_map = {old_id: copy.id for old_id, copy in copies.items()}
+    id_map.update({old_id: copy.id for old_id, (copy, _) in archived_copies.items()})
+    
+    for entry in source_db.query(ListingStatusHistory).filter(ListingStatusHistory.user_id == user.id):
+        history = ListingStatusHistory(**_columns(entry, exclude=("id",)))
+        history.listing_id = id_map.get(entry.listing_id, entry.listing_id)
+        target_db.add(history)
+    
+    return id_map
+
+
+def _set_moving(primary: Session, user: User, shard_db: Optional[Session], moving: bool) -> None:
+    """Set or clear a user's moving flag in the directory and in their copy on a shard, committing both."""
+    user.moving = moving
+    notify_user_changed(primary, user.id)
+    primary.commit()
+    
+    if shard_db is not None:
+        sync_user_to_shard(shard_db, user)
+        shard_db.commit()
+
+
+def _drain_seconds() -> float:
+    """How long to wait for workers to see a moving flag and finish requests already under way."""
+    drain = settings.rebalance_drain_seconds
+    if settings.events_enabled:
+        drain += settings.events_poll_interval_ms / 1000
+    return drain
+
+
+def rebalance_user(user_id: int, target_shard: int) -> dict:
+    """
+    Move a user's listings, archive and status history to another shard.
+    
+    The user is first flagged as moving, which makes their listing requests
+    fail with 503 and keeps the archiver away, and the move waits for
+    requests already under way to finish. Rows are then copied to the
+    target shard, the users directory is switched over (clearing the flag),
+    and the old rows are deleted. Moved listings get new IDs. If anything
+    still changes the user's rows during the copy, it is discarded and the
+    move fails. Users with listings waiting on n8n callbacks or with running
+    bulk jobs cannot be moved.
+    
+    Returns:
+        Source and target shard with the new ID of each moved listing
+    
+    Raises:
+        RebalanceError: If the user or shard is unknown or the user is busy
+    """
+    if not 0 <= target_shard < len(shard_sessions):
+        raise RebalanceError(f"Unknown shard {target_shard}")
+    
+    primary = SessionLocal()
+    try:
+        user = primary.get(User, user_id)
+        if user is None:
+            raise RebalanceError(f"User {user_id} not found")
+        
+        source_shard = user.shard_id
+        if source_shard == target_shard:
+            return {"user_id": user_id, "source": source_shard, "target": target_shard, "listing_ids": {}}
+        
+        source_db = shard_sessions[source_shard]()
+        target_db = shard_sessions[target_shard]()
+        # The primary already holds the user row of shard 0
+        source_copy_db = source_db if source_shard != 0 else None
+        try:
+            _set_moving(primary, user, source_copy_db, True)
+            time.sleep(_drain_seconds())
+            
+            try:
+                fingerprint = _fingerprint(source_db, user_id)
+                try:
+                    id_map = _copy_user_rows(source_db, target_db, user)
+                    notify_listing_changed(target_db, user_id)
+                    target_db.commit()
+                except Exception:
+                    target_db.rollback()
+                    raise
+                
+                # Start a new transaction to see writes made during the copy
+                source_db.rollback()
+                if _fingerprint(source_db, user_id) != fingerprint:
+                    _delete_user_rows(target_db, user_id, keep_user=target_shard == 0)
+                    target_db.commit()
+                    raise RebalanceError(f"User {user_id} changed during the move; retry")
+            except Exception:
+                source_db.rollback()
+                _set_moving(primary, user, source_copy_db, False)
+                raise
+            
+            user.shard_id = target_shard
+            _set_moving(primary, user, target_db if target_shard != 0 else None, False)
+            
+            _delete_user_rows(source_db, user_id, keep_user=source_shard == 0)
+            notify_listing_changed(source_db, user_id)
+            source_db.commit()
+        finally:
+            source_db.close()
+            target_db.close()
+    finally:
+        primary.close()
+    
+    logger.info("Moved user %s from shard %s to shard %s (%d listings)", user_id, source_shard, target_shard, len(id_map))
+    return {"user_id": user_id, "source": source_shard, "target": target_shard, "listing_ids": id_map}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move a user's rows to another shard. The user's listing requests get 503 "
+                    "from the moment the move starts until it finishes."
+    )
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("target_shard", type=int)
+    args = parser.parse_args()
+    
+    init_shards()
+    print(rebalance_user(args.user_id, args.target_shard))
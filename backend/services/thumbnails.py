@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from PIL import Image, ImageOps
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> (max width/height in pixels, WebP quality)
+VARIANTS = {
+    "thumbnail": (200, 70),
+    "card": (600, 80),
+    "full": (1600, 85),
+}
+
+
+class ThumbnailError(Exception):
+    """Raised when a derivative cannot be produced."""
+    
+    def __init__(self, detail: str, status_code: int = 502):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class ThumbnailCache:
+    """
+    Size-bounded on-disk LRU cache of resized media derivatives.
+    
+    Derivatives are keyed by source URL and variant. Concurrent requests for
+    the same derivative share a single render. Derivatives are returned as
+    bytes, so evicting a file never cuts off a response serving it.
+    
+    Workers share the cache directory. Reads touch a file's mtime, and the
+    index is rebuilt from the directory whenever the cache looks full or
+    rescan_interval has passed, so max_bytes bounds the directory as a whole.
+    Remote sources are only fetched from allowed_hosts.
+    """
+    
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int,
+        max_source_bytes: int,
+        resolve_local: Optional[Callable[[str], Optional[Path]]] = None,
+        allowed_hosts: Iterable[str] = (),
+        rescan_interval: float = 60.0
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_source_bytes = max_source_bytes
+        self.resolve_local = resolve_local
+        self.allowed_hosts = {host.lower() for host in allowed_hosts}
+        self.rescan_interval = rescan_interval
+        self._entries: Optional[OrderedDict[Path, int]] = None
+        self._total_bytes = 0
+        self._indexed_at = 0.0
+        self._inflight: Dict[Path, asyncio.Future] = {}
+    
+    async def get(self, source_url: str, variant: str) -> bytes:
+        """
+        Return the cached derivative for a source URL, rendering it if needed.
+        
+        Raises:
+            ThumbnailError: If the variant is unknown or the source cannot be rendered
+        """
+        if variant not in VARIANTS:
+            raise ThumbnailError(f"Unknown variant '{variant}'", status_code=404)
+        
+        if self._entries is None:
+            await self._load_index()
+        
+        key = hashlib.sha256(f"{source_url}|{variant}".encode("utf-8")).hexdigest()
+        path = self.root / key[:2] / f"{key}.webp"
+        
+        # Look on disk even when the index misses, as another worker may
+        # have rendered the derivative since the last rescan
+        data = await asyncio.to_thread(self._read, path)
+        if data is not None:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                await self._add(path, len(data))
+            metrics.increment("thumbnails.cache.hits")
+            return data
+        # Evicted by another worker, if it was indexed
+        self._forget(path)
+        
+        inflight = self._inflight.get(path)
+        if inflight is not None:
+            metrics.increment("thumbnails.cache.coalesced")
+            return await asyncio.shield(inflight)
+        
+        metrics.increment("thumbnails.cache.misses")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        try:
+            data = await self._render(source_url, variant, path)
+            await self._add(path, len(data))
+            future.set_result(data)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure is not logged
+            future.exception()
+            raise
+        finally:
+            del self._inflight[path]
+        
+        return data
+    
+    async def prewarm(self, source_urls: Iterable[str], variants: Iterable[str] = ("thumbnail", "card")) -> None:
+        """Render derivatives ahead of the first request, ignoring failures."""
+        for source_url in source_urls:
+            for variant in variants:
+                try:
+                    await self.get(source_url, variant)
+                except Exception:
+                    logger.warning("Failed to prewarm %s derivative of %s", variant, source_url)
+    
+    async def _render(self, source_url: str, variant: str, path: Path) -> bytes:
+        """Fetch, resize and store a derivative, returning it."""
+        source = await self._fetch(source_url)
+        size, quality = VARIANTS[variant]
+        return await asyncio.to_thread(self._resize_and_store, source, size, quality, path)
+    
+    async def _fetch(self, source_url: str) -> bytes:
+        """
+        Read a source image from local media storage or over HTTP.
+        
+        Remote sources, and every redirect they lead to, must be on an
+        allowed host.
+        """
+        local_path = self.resolve_local(source_url) if self.resolve_local else None
+        if local_path is not None:
+            return await asyncio.to_thread(local_path.read_bytes)
+        
+        self._check_host(source_url)
+        
+        async def check_request(request: httpx.Request) -> None:
+            self._check_host(str(request.url))
+        
+        chunks = []
+        received = 0
+        try:
+            async with httpx.AsyncClient(
+                follow_redirects=True,
+                event_hooks={"request": [check_request]}
+            ) as client:
+                async with client.stream("GET", source_url, timeout=30.0) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        received += len(chunk)
+                        if received > self.max_source_bytes:
+                            raise ThumbnailError("Source image is too large", status_code=413)
+                        chunks.append(chunk)
+        except httpx.HTTPError as e:
+            raise ThumbnailError(f"Failed to fetch source image: {str(e)}")
+        
+        return b"".join(chunks)
+    
+    def _check_host(self, url: str) -> None:
+        """
+        Check that a source URL may be fetched.
+        
+        Raises:
+            ThumbnailError: If the URL is not http(s) on an allowed host
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or (parts.hostname or "").lower() not in self.allowed_hosts:
+            raise ThumbnailError("Source image host is not allowed", status_code=403)
+    
+    def _resize_and_store(self, source: bytes, size: int, quality: int, path: Path) -> bytes:
+        """Resize an image to fit within size x size and write it as WebP."""
+        try:
+            with Image.open(io.BytesIO(source)) as image:
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+                image.thumbnail((size, size))
+                
+                output = io.BytesIO()
+                image.save(output, format="WEBP", quality=quality)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise ThumbnailError("Source is not a supported image", status_code=422)
+        
+        data = output.getvalue()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temporary file of its own, as other workers may render the same derivative
+        tmp = tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False)
+        try:
+            with tmp:
+                tmp.write(data)
+            os.replace(tmp.name, path)
+        except OSError:
+            Path(tmp.name).unlink(missing_ok=True)
+            raise
+        return data
+    
+    @staticmethod
+    def _read(path: Path) -> Optional[bytes]:
+        """Read a cached derivative and mark it recently used, or None if it is gone."""
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+    
+    def _scan(self) -> OrderedDict:
+        """Index the files on disk by mtime, oldest first."""
+        files = []
+        if self.root.exists():
+            for path in self.root.glob("*/*.webp"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+        
+        return OrderedDict((path, size) for _, path, size in sorted(files))
+    
+    async def _load_index(self) -> None:
+        """Rebuild the LRU index from the files on disk, including other workers' files."""
+        entries = await asyncio.to_thread(self._scan)
+        self._entries = entries
+        self._total_bytes = sum(entries.values())
+        self._indexed_at = time.monotonic()
+    
+    def _forget(self, path: Path) -> None:
+        """Drop a derivative that disappeared from disk from the index."""
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._total_bytes -= size
+    
+    async def _add(self, path: Path, size: int) -> None:
+        """Record a new derivative and evict least recently used ones."""
+        self._entries[path] = size
+        self._total_bytes += size
+        
+        if self._total_bytes > self.max_bytes or time.monotonic() - self._indexed_at > self.rescan_interval:
+            await self._load_index()
+        
+        # Evict to below the bound so the directory is not rescanned on every add
+        if self._total_bytes > self.max_bytes:
+            while self._total_bytes > self.max_bytes * 0.9 and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                old_path.unlink(missing_ok=True)
+                metrics.increment("thumbnails.cache.evictions")
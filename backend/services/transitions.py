@@ -0,0 +1,71 @@
+from typing import Any, Iterable, Optional, Union
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import Listing, ListingStatus, ListingStatusHistory
+from services.events import notify_listing_changed
+
+
+def apply_transition(
+    db: Session,
+    listing_id: int,
+    from_status: Union[ListingStatus, Iterable[ListingStatus]],
+    to_status: ListingStatus,
+    user_id: Optional[int] = None,
+    criteria: Iterable[Any] = (),
+    trace_id: Optional[str] = None,
+    **values: Any
+) -> Optional[Listing]:
+    """
+    Move a listing between statuses with a single compare-and-set UPDATE.
+    
+    The update only matches while the listing is still in one of the expected
+    statuses (and owned by user_id, when given), so concurrent transitions
+    cannot both succeed. Successful transitions are added to the status
+    history and published on the change bus. The change is flushed but not
+    committed.
+    
+    Args:
+        db: Database session
+        listing_id: ID of the listing
+        from_status: Expected current status or statuses
+        to_status: Status to move to
+        user_id: Owner to match, or None for webhook callbacks
+        criteria: Extra WHERE clauses the listing must satisfy
+        trace_id: Pipeline trace ID to record with the transition
+        **values: Additional column values to set
+    
+    Returns:
+        The updated listing, or None if no listing matched
+    """
+    if isinstance(from_status, ListingStatus):
+        from_status = [from_status]
+    
+    conditions = [Listing.id == listing_id, Listing.status.in_(list(from_status))]
+    if user_id is not None:
+        conditions.append(Listing.user_id == user_id)
+    conditions.extend(criteria)
+    
+    stmt = (
+        update(Listing)
+        .where(*conditions)
+        .values(status=to_status, version=Listing.version + 1, **values)
+        .returning(Listing)
+    )
+    listing = db.execute(stmt).scalar_one_or_none()
+    
+    if listing is not None:
+        record_status(db, listing, trace_id=trace_id)
+        notify_listing_changed(db, listing.user_id, listing.id)
+    
+    return listing
+
+
+def record_status(db: Session, listing: Listing, trace_id: Optional[str] = None) -> None:
+    """Add the listing's current status to its status history."""
+    db.add(ListingStatusHistory(
+        listing_id=listing.id,
+        user_id=listing.user_id,
+        status=ListingStatus(listing.status),
+        trace_id=trace_id
+    ))
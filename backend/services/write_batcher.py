@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from core.database import SessionLocal
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WriteFn = Callable[[Session], Any]
+
+
+class GroupCommitWriter:
+    """
+    Coalesce small write transactions into group commits.
+    
+    Callers submit functions that apply changes to a session without
+    committing. A single writer task runs queued functions together and
+    commits once per batch, bounded by max_batch items or max_delay seconds.
+    Each caller is resumed only after its batch is durable. Functions that
+    reject a write (e.g. with an HTTPException) must do so before changing
+    anything, since the rest of the batch shares their transaction.
+    """
+    
+    def __init__(
+        self,
+        max_batch: int = 100,
+        max_delay: float = 0.005,
+        session_factory: sessionmaker = SessionLocal
+    ):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def submit(self, fn: WriteFn) -> Any:
+        """
+        Queue a write and wait until its batch has been committed.
+        
+        Returns:
+            The return value of fn; exceptions raised by fn are re-raised
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self._queue.put((fn, future))
+        return await future
+    
+    async def stop(self) -> None:
+        """Stop the writer task once queued writes are committed."""
+        if self._task is None:
+            return
+        
+        await self._queue.join()
+        self._task.cancel()
+        self._task = None
+    
+    async def _run(self) -> None:
+        """Collect queued writes into batches and commit them."""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                outcomes = await asyncio.to_thread(self._commit_batch, [fn for fn, _ in batch])
+            except Exception as e:
+                outcomes = [(False, e)] * len(batch)
+            
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _commit_batch(self, fns: List[WriteFn]) -> List[Tuple[bool, Any]]:
+        """
+        Apply a batch of writes in one transaction.
+        
+        Writes that raise are reported to their caller only. If the commit
+        itself fails, the batch is retried one write per transaction so a
+        single bad write cannot fail its neighbours.
+        """
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            outcomes = []
+            for fn in fns:
+                try:
+                    outcomes.append((True, fn(db)))
+                except Exception as e:
+                    outcomes.append((False, e))
+            
+            try:
+                db.commit()
+            except Exception:
+                logger.exception("Group commit failed, retrying writes individually")
+                db.rollback()
+                return [self._commit_one(db, fn) for fn in fns]
+        finally:
+            db.close()
+        
+        metrics.observe("webhooks.group_commit.batch_size", len(fns))
+        metrics.observe("webhooks.group_commit.seconds", time.perf_counter() - started)
+        return outcomes
+    
+    @staticmethod
+    def _commit_one(db: Session, fn: WriteFn) -> Tuple[bool, Any]:
+        """Apply and commit a single write."""
+        try:
+            result = fn(db)
+            db.commit()
+            return True, result
+        except Exception as e:
+            db.rollback()
+            return False, e